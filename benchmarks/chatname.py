@@ -0,0 +1,55 @@
+"""Micro-benchmark: CHAT_TITLE translate table vs the old replace loop.
+
+Run from the repository root:  python benchmarks/chatname.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from driver.design import chatname  # noqa: E402
+from driver.design.chatname import CHAT_TITLE, plain_title  # noqa: E402
+
+TITLES = [
+    "𝕸𝖚𝖘𝖎𝖈 𝕷𝖔𝖛𝖊𝖗𝖘 ♪ Chat",
+    "ＶＩＢＥＳ ｏｎｌｙ",
+    "𝓣𝓱𝓮 𝓛𝓸𝓾𝓷𝓰𝓮 ~ 24/7",
+    "Plain group title without styling",
+    "قروب الأغاني 𝐀𝐫𝐚𝐛𝐢𝐜 𝐌𝐮𝐬𝐢𝐜",
+]
+
+
+def legacy(ctitle):
+    string = ctitle
+    for cout in range(26):
+        for font in chatname._UPPER:
+            string = string.replace(font[cout], chatname.normal[cout])
+        for font in chatname._LOWER:
+            string = string.replace(font[cout], chatname.normalL[cout])
+    return string
+
+
+def main(number=2000):
+    for title in TITLES:
+        assert plain_title(title) == legacy(title), title
+
+    def memoized():
+        for chat_id, title in enumerate(TITLES):
+            # CHAT_TITLE never suspends, drive the coroutine by hand
+            try:
+                CHAT_TITLE(title, chat_id).send(None)
+            except StopIteration:
+                pass
+
+    old = timeit.timeit(lambda: [legacy(t) for t in TITLES], number=number)
+    new = timeit.timeit(lambda: [plain_title(t) for t in TITLES], number=number)
+    calls = number * len(TITLES)
+    print(f"replace loop : {old / calls * 1e6:8.2f} µs/title")
+    print(f"translate    : {new / calls * 1e6:8.2f} µs/title  ({old / new:.0f}x)")
+    memo = timeit.timeit(memoized, number=number)
+    print(f"memoized     : {memo / calls * 1e6:8.2f} µs/title  ({old / memo:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
 from cache.admins import admins, get, set
+from cache.lru import TTLCache
+from cache.members import get_member, invalidate, member_stats
 
-__all__ = ["admins", "get", "set"]
+__all__ = ["admins", "get", "set", "TTLCache", "get_member", "invalidate", "member_stats"]
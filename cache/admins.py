@@ -1,15 +1,16 @@
-from config import admins
-from typing import Dict, List
+from typing import List
 
+from cache.lru import TTLCache
+from config import MEMBER_CACHE_SIZE, MEMBER_CACHE_TTL
 
-admins: Dict[int, List[int]] = {}
+
+# chat_id -> ids of the admins allowed to manage voice chats
+admins = TTLCache(maxsize=MEMBER_CACHE_SIZE, ttl=MEMBER_CACHE_TTL)
 
 
 def set(chat_id: int, admins_: List[int]):
-    admins[chat_id] = admins_
+    admins.set(chat_id, admins_)
 
 
 def get(chat_id: int) -> List[int]:
-    if chat_id in admins:
-        return admins[chat_id]
-    return []
+    return admins.get(chat_id, [])
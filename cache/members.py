@@ -0,0 +1,36 @@
+from typing import Optional
+
+from cache.admins import admins
+from cache.lru import TTLCache
+from config import MEMBER_CACHE_SIZE, MEMBER_CACHE_TTL
+
+
+# (chat_id, user_id) -> ChatMember, shared by permission checks and buttons
+members = TTLCache(maxsize=MEMBER_CACHE_SIZE, ttl=MEMBER_CACHE_TTL)
+
+
+async def get_member(client, chat_id: int, user_id: int):
+    """``client.get_chat_member`` served from cache while it is fresh."""
+    key = (chat_id, user_id)
+    member = members.get(key)
+    if member is None:
+        member = await client.get_chat_member(chat_id, user_id)
+        members.set(key, member)
+    return member
+
+
+def invalidate(chat_id: int, user_id: Optional[int] = None):
+    """Forget one member of a chat, or the whole chat when no user is given.
+
+    The chat's admin list goes too, since any member change may promote or
+    demote someone.
+    """
+    admins.pop(chat_id)
+    if user_id is not None:
+        members.pop((chat_id, user_id))
+    else:
+        members.evict(lambda key: key[0] == chat_id)
+
+
+def member_stats() -> dict:
+    return {**members.stats(), "admin_lists": len(admins)}
@@ -0,0 +1,155 @@
+"""Run the bot as several shard processes behind a small coordinator.
+
+Every worker runs the full bot (its own bot connection and its own
+assistants) but only handles the chats ``driver.shards.owns`` gives it.
+The coordinator starts the workers, relays what one publishes to all the
+others and restarts any that die. With SHARD_COUNT at 1, or too few
+assistant sessions to give each shard its own, it just runs main.py's
+single process.
+
+Telegram does not promise a bot's updates to every session it has open,
+so only ``UPDATES_SHARD``'s bot connection asks for them; the others
+connect without updates. That shard keeps the updates for its own chats
+and routes the rest here, and the coordinator forwards each one over the
+pipe of the shard that owns the chat (program/sharding.py). While that
+shard restarts, updates for it are dropped.
+
+    SHARD_COUNT=4 python cluster.py
+"""
+
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+from multiprocessing.connection import wait
+from time import monotonic
+from typing import Dict, Optional
+
+from config import EXTRA_SESSION_STRINGS, SESSION_STRING, SHARD_COUNT
+from driver.shards import ROUTE_TOPIC
+
+RESTART_DELAY = 10
+# messages queued for one shard before new ones for it are dropped
+OUTBOX_LIMIT = 10000
+
+
+def _worker(conn):
+    from driver import shards
+    shards.attach(conn)
+    import main
+    asyncio.run(main.simple_main())
+
+
+class _Link:
+    """One shard's process and pipe; sends never block the relay loop."""
+
+    def __init__(self, shard_id: int, process, conn):
+        self.shard_id = shard_id
+        self.process = process
+        self.conn = conn
+        self.dropped = 0
+        self._outbox: queue.Queue = queue.Queue(maxsize=OUTBOX_LIMIT)
+        threading.Thread(target=self._write, name=f"link-{shard_id}", daemon=True).start()
+
+    def _write(self):
+        while True:
+            message = self._outbox.get()
+            if message is None:
+                return
+            try:
+                self.conn.send(message)
+            except (BrokenPipeError, OSError):
+                return
+
+    def send(self, message):
+        try:
+            self._outbox.put_nowait(message)
+        except queue.Full:
+            # a shard that is starting up or stuck; its mirrors reconcile later
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                print(f"⚠️  Shard {self.shard_id} is not reading, dropped {self.dropped} messages")
+
+    def close(self):
+        try:
+            self._outbox.put_nowait(None)
+        except queue.Full:
+            pass  # the writer stops on the closed pipe instead
+        self.conn.close()
+
+
+def _spawn(ctx, shard_id: int, count: int) -> _Link:
+    parent, child = ctx.Pipe()
+    # the spawned child inherits the environment and imports config
+    # before _worker runs, so the shard identity has to be set here
+    os.environ["SHARD_ID"] = str(shard_id)
+    os.environ["SHARD_COUNT"] = str(count)
+    process = ctx.Process(target=_worker, args=(child,), name=f"shard-{shard_id}")
+    process.start()
+    child.close()
+    return _Link(shard_id, process, parent)
+
+
+def _relay(count: int):
+    ctx = multiprocessing.get_context("spawn")
+    links: Dict[int, Optional[_Link]] = {shard_id: _spawn(ctx, shard_id, count) for shard_id in range(count)}
+    restart_at: Dict[int, float] = {}
+    lost = 0
+    print(f"✅ Coordinator started {count} shards")
+    try:
+        while True:
+            live = {link.conn: link for link in links.values() if link is not None}
+            for conn in wait(list(live), timeout=1):
+                sender = live[conn]
+                try:
+                    topic, payload = conn.recv()
+                except (EOFError, OSError):
+                    continue
+                if topic == ROUTE_TOPIC:
+                    shard_id, message = payload
+                    target = links.get(shard_id)
+                    if target is not None:
+                        target.send((ROUTE_TOPIC, message))
+                    else:
+                        lost += 1
+                        if lost % 100 == 1:
+                            print(f"⚠️  Shard {shard_id} is restarting, dropped {lost} routed updates")
+                    continue
+                for link in links.values():
+                    if link is not None and link is not sender:
+                        link.send((topic, payload))
+            now = monotonic()
+            for shard_id, link in list(links.items()):
+                if link is not None and not link.process.is_alive():
+                    print(f"⚠️  Shard {shard_id} exited ({link.process.exitcode}), restarting in {RESTART_DELAY}s")
+                    link.close()
+                    links[shard_id] = None
+                    restart_at[shard_id] = now + RESTART_DELAY
+            for shard_id, when in list(restart_at.items()):
+                if now >= when:
+                    del restart_at[shard_id]
+                    links[shard_id] = _spawn(ctx, shard_id, count)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for link in links.values():
+            if link is not None:
+                link.process.terminate()
+                link.process.join(timeout=10)
+
+
+def run():
+    sessions = len([SESSION_STRING] + EXTRA_SESSION_STRINGS) if SESSION_STRING else 1
+    count = min(SHARD_COUNT, sessions)
+    if count < SHARD_COUNT:
+        print(f"⚠️  {SHARD_COUNT} shards need as many assistant sessions, running {count}")
+    if count <= 1:
+        import main
+        asyncio.run(main.simple_main())
+        return
+    _relay(count)
+
+
+if __name__ == "__main__":
+    run()
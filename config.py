@@ -40,6 +40,8 @@ API_HASH = os.getenv("API_HASH", "ff991e0856938ede932dc88fa2f15b61")
 BOT_TOKEN = os.getenv("BOT_TOKEN", "5990830200:AAGlQbppgRb5J9xIh2MrKJOrGW7IP768yRs")
 SESSION_NAME = os.getenv("SESSION_NAME", "MusicBot_Session")
 SESSION_STRING = os.getenv("SESSION_STRING", "")
+# more assistant accounts, space separated; each gets its own voice chat client
+EXTRA_SESSION_STRINGS = os.getenv("EXTRA_SESSION_STRINGS", "").split()
 
 # Validate critical variables
 if not all([API_ID, API_HASH, BOT_TOKEN]):
@@ -116,6 +118,56 @@ GENIUS_API_TOKEN = os.getenv("GENIUS_API_TOKEN", "")
 MAX_CONCURRENT_TRANSMISSIONS = getenv_int("MAX_CONCURRENT_TRANSMISSIONS", 3)
 CLEANMODE_DELETE_MINS = getenv_int("CLEANMODE_DELETE_MINS", 5)
 
+# yt-dlp extraction pool: worker processes, queued jobs beyond them, seconds per job
+RESOLVER_WORKERS = getenv_int("RESOLVER_WORKERS", 2)
+RESOLVER_QUEUE = getenv_int("RESOLVER_QUEUE", 32)
+RESOLVER_TIMEOUT = getenv_int("RESOLVER_TIMEOUT", 25)
+
+# youtube searches running at once, and seconds before one is given up
+SEARCH_CONCURRENCY = getenv_int("SEARCH_CONCURRENCY", 4)
+SEARCH_TIMEOUT = getenv_int("SEARCH_TIMEOUT", 10)
+
+# disk quota for rendered now-playing cards under search/cards
+THUMB_CACHE_MB = getenv_int("THUMB_CACHE_MB", 200)
+
+# disk quota for telegram audio/video kept under downloads/media for replays
+MEDIA_CACHE_MB = getenv_int("MEDIA_CACHE_MB", 2048)
+
+# pre-transcoded copies of popular tracks under downloads/transcoded: disk
+# quota, plays a day before a track is prepared, ffmpeg jobs at once and
+# the longest track in seconds worth preparing (live streams never are)
+TRANSCODE_CACHE_MB = getenv_int("TRANSCODE_CACHE_MB", 4096)
+TRANSCODE_MIN_PLAYS = getenv_int("TRANSCODE_MIN_PLAYS", 3)
+TRANSCODE_WORKERS = getenv_int("TRANSCODE_WORKERS", 1)
+TRANSCODE_MAX_DURATION = getenv_int("TRANSCODE_MAX_DURATION", 20 * 60)
+
+# ffmpeg supervisor: processes allowed at once (calls plus background
+# transcodes), seconds between cpu/memory samples
+FFMPEG_MAX_PROCS = getenv_int("FFMPEG_MAX_PROCS", 50)
+FFMPEG_SAMPLE_INTERVAL = getenv_int("FFMPEG_SAMPLE_INTERVAL", 10)
+
+# chat member / admin list cache: entries kept, seconds before a refetch
+MEMBER_CACHE_SIZE = getenv_int("MEMBER_CACHE_SIZE", 4096)
+MEMBER_CACHE_TTL = getenv_int("MEMBER_CACHE_TTL", 300)
+
+# seconds between re-reads of the in-memory blacklist and gban sets
+BAN_SYNC_INTERVAL = getenv_int("BAN_SYNC_INTERVAL", 600)
+
+# background fan-out jobs (broadcasts): bot API calls per second, chats in flight
+BROADCAST_RATE = getenv_int("BROADCAST_RATE", 25)
+JOB_WORKERS = getenv_int("JOB_WORKERS", 8)
+
+# assistant pool: calls per account before new chats go elsewhere, and
+# seconds a banned or deactivated account is left alone
+ASSISTANT_MAX_CALLS = getenv_int("ASSISTANT_MAX_CALLS", 25)
+ASSISTANT_COOLDOWN = getenv_int("ASSISTANT_COOLDOWN", 1800)
+
+# sharded mode (cluster.py): number of worker processes and this one's index;
+# each shard keeps its media, transcode and card caches (and their disk
+# quotas above) in a folder of its own
+SHARD_COUNT = getenv_int("SHARD_COUNT", 1)
+SHARD_ID = getenv_int("SHARD_ID", 0)
+
 # Auto-join channels (FIXED - empty to avoid errors)
 AUTO_JOIN_CHANNELS = []  # Disabled to prevent channel access errors
 
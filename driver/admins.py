@@ -1,19 +1,18 @@
 from typing import List
 from pyrogram.types import Chat
-from cache.admins import get as gett, set
+from cache.admins import admins, set
 
 async def get_administrators(chat: Chat) -> List[int]:
-    get = gett(chat.id)
+    cached = admins.get(chat.id)
+    if cached is not None:
+        return cached
 
-    if get:
-        return get
-    else:
-        administrators = await chat.get_members(filter="administrators")
-        to_set = []
+    administrators = await chat.get_members(filter="administrators")
+    to_set = []
 
-        for administrator in administrators:
-            if administrator.can_manage_voice_chats:
-                to_set.append(administrator.user.id)
+    for administrator in administrators:
+        if administrator.can_manage_voice_chats:
+            to_set.append(administrator.user.id)
 
-        set(chat.id, to_set)
-        return await get_administrators(chat)
+    set(chat.id, to_set)
+    return to_set
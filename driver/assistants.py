@@ -0,0 +1,228 @@
+import asyncio
+import hashlib
+from collections import deque
+from time import monotonic
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+from config import ASSISTANT_COOLDOWN, ASSISTANT_MAX_CALLS
+from driver.database.dbassistants import load_assignments, save_assignments
+from driver.writebehind import WriteBehind
+
+# errors after which an account cannot serve calls for a while (or ever)
+ACCOUNT_ERRORS = {
+    "AuthKeyUnregistered",
+    "SessionRevoked",
+    "UserDeactivated",
+    "UserDeactivatedBan",
+    "PeerFlood",
+}
+# FloodWaits remembered when weighing load
+FLOOD_MEMORY = 600
+
+
+class Assistant:
+    """One userbot account and the PyTgCalls instance that drives it."""
+
+    def __init__(self, client, calls):
+        self.client = client
+        self.calls = calls
+        self.me = None
+        self.chats: Set[int] = set()
+        self.floods: Deque[float] = deque(maxlen=32)
+        self.limited_until = 0.0
+        self.down_until = 0.0
+
+    @property
+    def id(self) -> Optional[int]:
+        return self.me.id if self.me else None
+
+    def recent_floods(self) -> int:
+        cutoff = monotonic() - FLOOD_MEMORY
+        return sum(1 for stamp in self.floods if stamp > cutoff)
+
+    @property
+    def load(self) -> int:
+        return len(self.chats) + 2 * self.recent_floods()
+
+    @property
+    def usable(self) -> bool:
+        now = monotonic()
+        return self.me is not None and now >= self.down_until and now >= self.limited_until
+
+
+class AssistantPool:
+    """Assigns every chat to one assistant and keeps it there.
+
+    A new chat goes to the assistant ranking highest for it under
+    rendezvous hashing that still has room (fewer than
+    ``ASSISTANT_MAX_CALLS`` calls, recent FloodWaits counting extra), so
+    assignments stay put as accounts come and go. Assignments are
+    persisted, so a chat keeps its assistant (and the group membership it
+    already has) across restarts. A flood-limited account gets no new
+    chats until its wait is over; a banned or dead one hands its chats to
+    ``on_failover``.
+    """
+
+    def __init__(self):
+        self.assistants: List[Assistant] = []
+        self._sticky: Dict[int, int] = {}
+        self._writes = WriteBehind(self._persist, interval=5.0, name="assistant assignments")
+        self.on_failover: Optional[Callable[[int], Awaitable[None]]] = None
+
+    def add(self, client, calls) -> Assistant:
+        assistant = Assistant(client, calls)
+        self.assistants.append(assistant)
+        for event in ("on_kicked", "on_closed_voice_chat", "on_left"):
+            getattr(calls, event)()(self._released(assistant))
+        return assistant
+
+    @staticmethod
+    def _released(assistant: Assistant):
+        async def handler(_, chat_id: int):
+            assistant.chats.discard(chat_id)
+
+        return handler
+
+    @property
+    def primary(self) -> Assistant:
+        return self.assistants[0]
+
+    def by_id(self, assistant_id: Optional[int]) -> Optional[Assistant]:
+        for assistant in self.assistants:
+            if assistant.id == assistant_id:
+                return assistant
+        return None
+
+    async def _persist(self, chat_ids):
+        await save_assignments({chat_id: self._sticky.get(chat_id) for chat_id in chat_ids})
+
+    async def start(self):
+        self._sticky = await load_assignments()
+        self._writes.start()
+
+    async def stop(self):
+        await self._writes.stop()
+
+    @staticmethod
+    def _rank(chat_id: int, assistant: Assistant) -> int:
+        digest = hashlib.blake2b(f"{chat_id}:{assistant.id}".encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+
+    def _choose(self, chat_id: int) -> Assistant:
+        usable = [a for a in self.assistants if a.usable]
+        if not usable:
+            # everyone is limited; the least bad account still beats none
+            usable = [a for a in self.assistants if a.me is not None] or self.assistants
+        ranked = sorted(usable, key=lambda a: self._rank(chat_id, a), reverse=True)
+        for assistant in ranked:
+            if assistant.load < ASSISTANT_MAX_CALLS:
+                return assistant
+        return min(ranked, key=lambda a: a.load)
+
+    def assistant_for(self, chat_id: int) -> Assistant:
+        """The assistant serving ``chat_id``, assigning one if needed."""
+        if len(self.assistants) == 1:
+            return self.primary
+        current = self.by_id(self._sticky.get(chat_id))
+        if current is not None and (current.usable or chat_id in current.chats):
+            return current
+        chosen = self._choose(chat_id)
+        if chosen.id is not None and self._sticky.get(chat_id) != chosen.id:
+            self._sticky[chat_id] = chosen.id
+            self._writes.mark(chat_id)
+        return chosen
+
+    def note_error(self, assistant: Assistant, error: BaseException):
+        """Weigh an error raised by one of ``assistant``'s calls."""
+        name = type(error).__name__
+        if name == "FloodWait":
+            wait = getattr(error, "value", None) or getattr(error, "x", 0) or 1
+            assistant.floods.append(monotonic())
+            # its running calls keep playing, only new chats go elsewhere
+            assistant.limited_until = max(assistant.limited_until, monotonic() + float(wait))
+        elif name in ACCOUNT_ERRORS:
+            assistant.down_until = monotonic() + ASSISTANT_COOLDOWN
+            self._fail_over(assistant, name)
+
+    def _fail_over(self, assistant: Assistant, reason: str):
+        chats = list(assistant.chats)
+        assistant.chats.clear()
+        print(f"⚠️  Assistant {assistant.id} unavailable ({reason}), moving {len(chats)} chats")
+        for chat_id, owner in list(self._sticky.items()):
+            if owner == assistant.id:
+                del self._sticky[chat_id]
+                self._writes.mark(chat_id)
+        if self.on_failover is not None and len(self.assistants) > 1:
+            for chat_id in chats:
+                asyncio.ensure_future(self.on_failover(chat_id))
+
+    def stats(self) -> List[dict]:
+        now = monotonic()
+        return [
+            {
+                "id": a.id,
+                "calls": len(a.chats),
+                "floods": a.recent_floods(),
+                "state": "down" if now < a.down_until else "limited" if now < a.limited_until else "ok",
+            }
+            for a in self.assistants
+        ]
+
+
+class CallRouter:
+    """Stands in for a single PyTgCalls and routes by chat to the pool.
+
+    ``calls.join_group_call(chat_id, ...)`` and friends run on the chat's
+    assistant; ``@calls.on_...()`` handlers are registered on every one.
+    ``admit(chat_id)`` may raise to refuse a call in a new chat.
+    """
+
+    def __init__(self, pool: AssistantPool):
+        self._pool = pool
+        self.admit: Optional[Callable[[int], None]] = None
+
+    def __getattr__(self, name: str):
+        if name.startswith("on_"):
+            def register(*args, **kwargs):
+                def decorator(func):
+                    for assistant in self._pool.assistants:
+                        getattr(assistant.calls, name)(*args, **kwargs)(func)
+                    return func
+
+                return decorator
+
+            return register
+
+        async def route(chat_id: int, *args, **kwargs):
+            if name == "join_group_call" and self.admit is not None:
+                if not any(chat_id in a.chats for a in self._pool.assistants):
+                    self.admit(chat_id)
+            assistant = self._pool.assistant_for(chat_id)
+            try:
+                result = await getattr(assistant.calls, name)(chat_id, *args, **kwargs)
+            except Exception as e:
+                self._pool.note_error(assistant, e)
+                if name == "leave_group_call":
+                    assistant.chats.discard(chat_id)
+                raise
+            if name == "join_group_call":
+                assistant.chats.add(chat_id)
+            elif name == "leave_group_call":
+                assistant.chats.discard(chat_id)
+            return result
+
+        return route
+
+    async def start(self):
+        for assistant in self._pool.assistants:
+            await assistant.calls.start()
+
+    async def stop(self):
+        for assistant in self._pool.assistants:
+            stop = getattr(assistant.calls, "stop", None)
+            if stop is not None:
+                await stop()
+
+    @property
+    def is_connected(self) -> bool:
+        return all(getattr(a.calls, "is_connected", True) for a in self._pool.assistants)
@@ -5,16 +5,27 @@ from pyrogram import Client
 from pyrogram.enums import ChatMemberStatus
 from pytgcalls import PyTgCalls
 from pytgcalls.types import Update
+from driver.assistants import AssistantPool, CallRouter
+from driver.shards import UPDATES_SHARD
 from config import (
     API_HASH, 
     API_ID, 
     BOT_TOKEN, 
     SESSION_NAME, 
     SESSION_STRING,
+    EXTRA_SESSION_STRINGS,
     BOT_NAME,
-    AUTO_JOIN_CHANNELS
+    AUTO_JOIN_CHANNELS,
+    BAN_SYNC_INTERVAL,
+    SHARD_COUNT,
+    SHARD_ID,
 )
 
+# each shard drives its own slice of the assistant accounts
+SESSIONS = [SESSION_STRING] + EXTRA_SESSION_STRINGS
+if SHARD_COUNT > 1:
+    SESSIONS = SESSIONS[SHARD_ID::SHARD_COUNT]
+
 class MusicBot:
     def __init__(self):
         self.bot: Optional[Client] = None
@@ -22,6 +33,7 @@ class MusicBot:
         self.calls: Optional[PyTgCalls] = None
         self.bot_info = None
         self.user_info = None
+        self.ban_sync: Optional[asyncio.Task] = None
 
 # Global instance
 music_bot = MusicBot()
@@ -37,7 +49,9 @@ try:
         bot_token=BOT_TOKEN,
         plugins={"root": "program"},
         in_memory=True,  # Better performance
-        max_concurrent_transmissions=3  # Prevent flood limits
+        max_concurrent_transmissions=3,  # Prevent flood limits
+        # one shard receives the updates and routes them (program/sharding.py)
+        no_updates=SHARD_COUNT > 1 and SHARD_ID != UPDATES_SHARD,
     )
     music_bot.bot = bot
     print("✅ Bot client initialized successfully")
@@ -49,10 +63,10 @@ except Exception as e:
 # USERBOT CLIENT (ASSISTANT)
 # =======================
 try:
-    if SESSION_STRING:
+    if SESSIONS[0]:
         user = Client(
             name=SESSION_NAME,
-            session_string=SESSION_STRING,
+            session_string=SESSIONS[0],
             api_id=API_ID,
             api_hash=API_HASH,
             in_memory=True,
@@ -73,25 +87,39 @@ except Exception as e:
     sys.exit(1)
 
 # =======================
-# PYTGCALLS CLIENT (FIXED)
+# PYTGCALLS CLIENTS (ASSISTANT POOL)
 # =======================
+def make_calls(client: Client) -> PyTgCalls:
+    try:
+        return PyTgCalls(
+            client,
+            cache_duration=120  # Removed log_mode parameter
+        )
+    except Exception as e:
+        print(f"⚠️  PyTgCalls init error, retrying without cache_duration: {e}")
+        return PyTgCalls(client)
+
+
+assistants = AssistantPool()
 try:
-    calls = PyTgCalls(
-        user,
-        cache_duration=120  # Removed log_mode parameter
-    )
+    assistants.add(user, make_calls(user))
+    for index, session in enumerate(SESSIONS[1:], 2):
+        extra = Client(
+            name=f"{SESSION_NAME}_{index}",
+            session_string=session,
+            api_id=API_ID,
+            api_hash=API_HASH,
+            in_memory=True,
+            max_concurrent_transmissions=3
+        )
+        assistants.add(extra, make_calls(extra))
+    # every call is routed to the assistant that owns the chat
+    calls = CallRouter(assistants)
     music_bot.calls = calls
-    print("✅ PyTgCalls client initialized successfully")
+    print(f"✅ PyTgCalls initialized for {len(assistants.assistants)} assistants")
 except Exception as e:
     print(f"❌ Failed to initialize PyTgCalls client: {e}")
-    # Try without cache_duration as fallback
-    try:
-        calls = PyTgCalls(user)
-        music_bot.calls = calls
-        print("✅ PyTgCalls client initialized successfully (fallback mode)")
-    except Exception as fallback_error:
-        print(f"❌ Failed to initialize PyTgCalls client (fallback): {fallback_error}")
-        sys.exit(1)
+    sys.exit(1)
 
 # =======================
 # HELPER FUNCTIONS
@@ -142,31 +170,30 @@ async def auto_join_channels():
 async def start_clients():
     """Start all clients safely"""
     try:
+        # Fork the yt-dlp workers before the clients spin up their threads
+        from driver.resolver import pool
+        pool.start()
+
         # Start bot client
         if music_bot.bot and not music_bot.bot.is_connected:
             await music_bot.bot.start()
             print("✅ Bot client started")
         
-        # Start userbot client
-        if music_bot.user and not music_bot.user.is_connected:
-            await music_bot.user.start()
-            print("✅ Userbot client started")
-        
-        # Start calls client with error handling
-        if music_bot.calls:
+        # Start every assistant and its calls client; one that fails stays
+        # out of the pool, but the bot needs at least one
+        for assistant in assistants.assistants:
             try:
-                await music_bot.calls.start()
-                print("✅ PyTgCalls client started")
+                if not assistant.client.is_connected:
+                    await assistant.client.start()
+                await assistant.calls.start()
+                assistant.me = await assistant.client.get_me()
+                print(f"✅ Assistant {assistant.me.first_name} ({assistant.me.id}) started")
             except Exception as e:
-                print(f"⚠️  PyTgCalls start error: {e}")
-                # Try to reinitialize calls client
-                try:
-                    music_bot.calls = PyTgCalls(music_bot.user)
-                    await music_bot.calls.start()
-                    print("✅ PyTgCalls client reinitialized and started")
-                except Exception as reinit_error:
-                    print(f"❌ Failed to reinitialize PyTgCalls: {reinit_error}")
-                    return False
+                print(f"⚠️  Assistant start error: {e}")
+        if not any(a.me for a in assistants.assistants):
+            print("❌ No assistant could be started")
+            return False
+        await assistants.start()
         
         # Get client info
         bot_info = await get_bot_info()
@@ -177,6 +204,49 @@ async def start_clients():
         if user_info:
             print(f"👤 Assistant: {user_info.first_name} ({user_info.id})")
         
+        from driver.database.dblocal import ensure_indexes
+        await ensure_indexes()
+
+        # Changes published by the other shards, when running sharded
+        from driver import shards
+        asyncio.get_event_loop().create_task(shards.listen())
+
+        # Blacklist and gban checks run on every message, keep them in memory
+        from driver.database.dblockchat import blacklist
+        from driver.database.dbpunish import gbans
+        from driver.database.mirror import reconcile_forever
+        try:
+            await asyncio.gather(blacklist.load(), gbans.load())
+            print(f"✅ Loaded {len(blacklist)} blacklisted chats, {len(gbans)} gbanned users")
+        except Exception as e:
+            print(f"⚠️  Ban list load error: {e}")
+        music_bot.ban_sync = asyncio.get_event_loop().create_task(
+            reconcile_forever(blacklist, gbans, interval=BAN_SYNC_INTERVAL)
+        )
+
+        # Rebuild the queues persisted before the last shutdown
+        from driver.mediacache import media_cache
+        from driver.utils import restore_playback, restream_completed
+        media_cache.on_complete = restream_completed
+        try:
+            await restore_playback()
+        except Exception as e:
+            print(f"⚠️  Queue restore error: {e}")
+
+        # Watch the ffmpeg processes behind the calls, refuse calls over the cap
+        from driver.supervisor import supervisor
+        calls.admit = supervisor.admit
+        supervisor.start()
+
+        # Pick up broadcasts and other fan-out jobs cut short by the restart
+        from driver.jobs import resume_jobs
+        try:
+            resumed = await resume_jobs(music_bot.bot)
+            if resumed:
+                print(f"✅ Resumed {resumed} background jobs")
+        except Exception as e:
+            print(f"⚠️  Job resume error: {e}")
+
         # Auto join channels
         await auto_join_channels()
         
@@ -191,6 +261,19 @@ async def start_clients():
 async def stop_clients():
     """Stop all clients safely"""
     try:
+        # Persist queues before leaving calls clears them
+        from driver.queues import snapshots
+        from driver.database.dbqueue import playback_state
+        from driver.jobs import suspend_jobs
+        await snapshots.stop()
+        await playback_state.stop()
+        await suspend_jobs()
+        await assistants.stop()
+
+        if music_bot.ban_sync:
+            music_bot.ban_sync.cancel()
+            music_bot.ban_sync = None
+
         if music_bot.calls:
             try:
                 await music_bot.calls.stop()
@@ -198,12 +281,13 @@ async def stop_clients():
             except Exception as e:
                 print(f"⚠️  Error stopping PyTgCalls: {e}")
         
-        if music_bot.user and music_bot.user.is_connected:
-            try:
-                await music_bot.user.stop()
-                print("✅ Userbot client stopped")
-            except Exception as e:
-                print(f"⚠️  Error stopping userbot: {e}")
+        for assistant in assistants.assistants:
+            if assistant.client.is_connected:
+                try:
+                    await assistant.client.stop()
+                    print("✅ Userbot client stopped")
+                except Exception as e:
+                    print(f"⚠️  Error stopping userbot: {e}")
         
         if music_bot.bot and music_bot.bot.is_connected:
             try:
@@ -211,6 +295,13 @@ async def stop_clients():
                 print("✅ Bot client stopped")
             except Exception as e:
                 print(f"⚠️  Error stopping bot: {e}")
+
+        from driver.resolver import pool
+        from driver.supervisor import supervisor
+        from driver.transcode import transcoder
+        pool.stop()
+        supervisor.stop()
+        transcoder.stop()
             
     except Exception as e:
         print(f"❌ Error stopping clients: {e}")
@@ -272,7 +363,7 @@ app = bot  # Alias for old code
 # EXPORTS
 # =======================
 __all__ = [
-    'bot', 'user', 'calls', 'app',
+    'bot', 'user', 'calls', 'app', 'assistants',
     'music_bot', 'start_clients', 'stop_clients',
     'health_check', 'restart_client',
     'get_bot_info', 'get_user_info'
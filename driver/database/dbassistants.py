@@ -0,0 +1,28 @@
+""" sticky chat -> assistant assignments """
+
+from typing import Dict, Optional
+
+from pymongo import DeleteOne, UpdateOne
+
+from driver.database.dblocal import db
+
+assistantsdb = db.assistants
+
+
+async def load_assignments() -> Dict[int, int]:
+    return {
+        doc["chat_id"]: doc["assistant_id"]
+        async for doc in assistantsdb.find({}, {"_id": 0})
+    }
+
+
+async def save_assignments(assignments: Dict[int, Optional[int]]):
+    """Write many assignments in one round trip; None forgets a chat."""
+    ops = [
+        UpdateOne({"chat_id": chat_id}, {"$set": {"assistant_id": assistant_id}}, upsert=True)
+        if assistant_id
+        else DeleteOne({"chat_id": chat_id})
+        for chat_id, assistant_id in assignments.items()
+    ]
+    if ops:
+        await assistantsdb.bulk_write(ops, ordered=False)
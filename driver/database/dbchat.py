@@ -2,9 +2,11 @@
 
 from typing import Dict, List, Union
 
-from driver.database.dblocal import db
+from driver.database.dblocal import CachedCount, db, delete_key, insert_key
+from driver.shards import publish, subscribe
 
 chatsdb = db.chats
+served_chats = CachedCount(chatsdb, {"chat_id": {"$lt": 0}})
 
 
 async def get_served_chats() -> list:
@@ -17,6 +19,10 @@ async def get_served_chats() -> list:
     return chats_list
 
 
+async def get_served_chats_count() -> int:
+    return await served_chats.get()
+
+
 async def is_served_chat(chat_id: int) -> bool:
     chat = await chatsdb.find_one({"chat_id": chat_id})
     if not chat:
@@ -24,15 +30,20 @@ async def is_served_chat(chat_id: int) -> bool:
     return True
 
 
-async def add_served_chat(chat_id: int):
-    is_served = await is_served_chat(chat_id)
-    if is_served:
-        return
-    return await chatsdb.insert_one({"chat_id": chat_id})
+async def add_served_chat(chat_id: int) -> bool:
+    added = await insert_key(chatsdb, "chat_id", chat_id)
+    if added and chat_id < 0:
+        served_chats.adjust(1)
+        publish("served_chats", 1)
+    return added
+
+
+async def remove_served_chat(chat_id: int) -> bool:
+    removed = await delete_key(chatsdb, "chat_id", chat_id)
+    if removed and chat_id < 0:
+        served_chats.adjust(-1)
+        publish("served_chats", -1)
+    return removed
 
 
-async def remove_served_chat(chat_id: int):
-    is_served = await is_served_chat(chat_id)
-    if not is_served:
-        return
-    return await chatsdb.delete_one({"chat_id": chat_id})
+subscribe("served_chats", served_chats.adjust)
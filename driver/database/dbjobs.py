@@ -0,0 +1,23 @@
+""" background fan-out jobs (broadcasts, global bans) """
+
+from typing import List
+
+from driver.database.dblocal import db
+
+jobsdb = db.jobs
+
+
+async def save_job(doc: dict):
+    await jobsdb.replace_one({"_id": doc["_id"]}, doc, upsert=True)
+
+
+async def update_job(job_id: str, fields: dict):
+    await jobsdb.update_one({"_id": job_id}, {"$set": fields})
+
+
+async def get_unfinished_jobs(shard: int) -> List[dict]:
+    # jobs saved before sharding existed have no shard and belong to shard 0
+    query = {"status": "running", "shard": shard}
+    if shard == 0:
+        query["shard"] = {"$in": [0, None]}
+    return [doc async for doc in jobsdb.find(query)]
@@ -1,8 +1,86 @@
 """ mongo database """
 
+from time import monotonic
+from typing import Optional
+
 from motor.motor_asyncio import AsyncIOMotorClient as Bot
+from pymongo.errors import DuplicateKeyError
 from config import MONGODB_URL as tmo
 
 
 MONGODB_CLI = Bot(tmo)
 db = MONGODB_CLI.program
+
+
+# (collection, field) pairs whose value identifies exactly one document
+UNIQUE_KEYS = [
+    ("chats", "chat_id"),
+    ("users", "user_id"),
+    ("pytg", "chat_id"),
+    ("admin", "chat_id_toggle"),
+    ("gban", "user_id"),
+    ("blacklistChat", "chat_id"),
+    ("queues", "chat_id"),
+]
+
+
+async def ensure_indexes():
+    """Create the unique indexes the writers rely on; safe to run on every boot."""
+    for name, field in UNIQUE_KEYS:
+        try:
+            await db[name].create_index(
+                field,
+                unique=True,
+                # collections shared with other documents only index their own
+                partialFilterExpression={field: {"$exists": True}},
+            )
+        except Exception as e:
+            # usually duplicates left by the old find-then-insert writers
+            print(f"⚠️  Could not index {name}.{field}: {e}")
+
+
+class CachedCount:
+    """Number of documents matching ``query``, kept in memory.
+
+    Counted server side on first use and again every ``ttl`` seconds to
+    absorb writes from elsewhere; in between, writers ``adjust`` it.
+    Without a query the collection metadata estimate is used.
+    """
+
+    def __init__(self, collection, query: Optional[dict] = None, ttl: float = 600.0):
+        self._collection = collection
+        self._query = query
+        self.ttl = ttl
+        self._value: Optional[int] = None
+        self._counted_at = 0.0
+
+    async def get(self) -> int:
+        if self._value is None or monotonic() - self._counted_at > self.ttl:
+            if self._query is None:
+                self._value = await self._collection.estimated_document_count()
+            else:
+                self._value = await self._collection.count_documents(self._query)
+            self._counted_at = monotonic()
+        return self._value
+
+    def adjust(self, delta: int):
+        if self._value is not None:
+            self._value += delta
+
+
+async def insert_key(collection, field: str, value) -> bool:
+    """Add ``{field: value}`` unless present; True if this call added it."""
+    try:
+        result = await collection.update_one(
+            {field: value}, {"$setOnInsert": {field: value}}, upsert=True
+        )
+    except DuplicateKeyError:
+        # a concurrent upsert won the race
+        return False
+    return result.upserted_id is not None
+
+
+async def delete_key(collection, field: str, value) -> bool:
+    """Remove ``{field: value}``; True if a document was removed."""
+    result = await collection.delete_one({field: value})
+    return result.deleted_count > 0
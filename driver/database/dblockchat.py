@@ -1,26 +1,42 @@
 from typing import Dict, List, Union
 
-from driver.database.dblocal import db
+from driver.database.dblocal import db, delete_key, insert_key
+from driver.database.mirror import MirroredSet
+from driver.shards import publish, subscribe
 
 blacklist_chatdb = db.blacklistChat
+blacklist = MirroredSet(blacklist_chatdb, "chat_id", {"chat_id": {"$lt": 0}})
+
+
+def is_blacklisted_chat(chat_id: int) -> bool:
+    return chat_id in blacklist
 
 
 async def blacklisted_chats() -> list:
-    chats = blacklist_chatdb.find({"chat_id": {"$lt": 0}})
-    return [
-        chat["chat_id"] for chat in await chats.to_list(length=1000000000)
-    ]
+    await blacklist.ensure_loaded()
+    return list(blacklist)
 
 
 async def blacklist_chat(chat_id: int) -> bool:
-    if not await blacklist_chatdb.find_one({"chat_id": chat_id}):
-        await blacklist_chatdb.insert_one({"chat_id": chat_id})
-        return True
-    return False
+    added = await insert_key(blacklist_chatdb, "chat_id", chat_id)
+    blacklist.add(chat_id)
+    publish("blacklist", (chat_id, True))
+    return added
 
 
 async def whitelist_chat(chat_id: int) -> bool:
-    if await blacklist_chatdb.find_one({"chat_id": chat_id}):
-        await blacklist_chatdb.delete_one({"chat_id": chat_id})
-        return True
-    return False
+    removed = await delete_key(blacklist_chatdb, "chat_id", chat_id)
+    blacklist.discard(chat_id)
+    publish("blacklist", (chat_id, False))
+    return removed
+
+
+def _apply(change):
+    chat_id, listed = change
+    if listed:
+        blacklist.add(chat_id)
+    else:
+        blacklist.discard(chat_id)
+
+
+subscribe("blacklist", _apply)
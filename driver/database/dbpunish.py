@@ -1,32 +1,47 @@
 from typing import Dict, List, Union
 
-from driver.database.dblocal import db
+from driver.database.dblocal import db, delete_key, insert_key
+from driver.database.mirror import MirroredSet
+from driver.shards import publish, subscribe
 
 gbansdb = db.gban
+gbans = MirroredSet(gbansdb, "user_id", {"user_id": {"$gt": 0}})
 
 
 async def get_gbans_count() -> int:
-    users = gbansdb.find({"user_id": {"$gt": 0}})
-    users = await users.to_list(length=100000)
-    return len(users)
+    await gbans.ensure_loaded()
+    return len(gbans)
+
+
+def is_gbanned(user_id: int) -> bool:
+    return user_id in gbans
 
 
 async def is_gbanned_user(user_id: int) -> bool:
-    user = await gbansdb.find_one({"user_id": user_id})
-    if not user:
-        return False
-    return True
+    await gbans.ensure_loaded()
+    return user_id in gbans
+
+
+async def add_gban_user(user_id: int) -> bool:
+    added = await insert_key(gbansdb, "user_id", user_id)
+    gbans.add(user_id)
+    publish("gban", (user_id, True))
+    return added
+
+
+async def remove_gban_user(user_id: int) -> bool:
+    removed = await delete_key(gbansdb, "user_id", user_id)
+    gbans.discard(user_id)
+    publish("gban", (user_id, False))
+    return removed
 
 
-async def add_gban_user(user_id: int):
-    is_gbanned = await is_gbanned_user(user_id)
-    if is_gbanned:
-        return
-    return await gbansdb.insert_one({"user_id": user_id})
+def _apply(change):
+    user_id, banned = change
+    if banned:
+        gbans.add(user_id)
+    else:
+        gbans.discard(user_id)
 
 
-async def remove_gban_user(user_id: int):
-    is_gbanned = await is_gbanned_user(user_id)
-    if not is_gbanned:
-        return
-    return await gbansdb.delete_one({"user_id": user_id})
+subscribe("gban", _apply)
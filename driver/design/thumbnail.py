@@ -1,4 +1,12 @@
+import asyncio
+import hashlib
 import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock
+from typing import Optional
+
 import aiofiles
 import aiohttp
 from PIL import (
@@ -7,6 +15,28 @@ from PIL import (
     ImageFont,
 )
 
+from cache.lru import TTLCache
+from config import THUMB_CACHE_MB
+from driver.shards import shard_dir
+
+# bump whenever the card layout changes so stale renders are never served
+TEMPLATE_VERSION = 1
+CARD_DIR = shard_dir("search/cards")
+
+# Pillow work is CPU bound, keep it away from the event loop
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="thumbnail")
+# FreeType faces are shared between the render threads
+_font_lock = Lock()
+_assets = None
+_session: Optional[aiohttp.ClientSession] = None
+
+# rendered cards: hot ones in memory, the rest on disk under a size quota
+cards = TTLCache(maxsize=64, ttl=6 * 60 * 60)
+_disk: "OrderedDict[str, int]" = OrderedDict()
+_disk_lock = Lock()
+_disk_loaded = False
+disk_hits = 0
+
 
 def changeImageSize(maxWidth, maxHeight, image):
     if image.size[0] == image.size[1]:
@@ -23,42 +53,180 @@ def changeImageSize(maxWidth, maxHeight, image):
     return newImage
 
 
+def _load_assets():
+    """Overlay and fonts, loaded from disk once per process."""
+    global _assets
+    if _assets is None:
+        overlay = changeImageSize(1280, 720, Image.open("driver/source/LightGreen.png"))
+        _assets = (
+            overlay.convert("RGBA"),
+            ImageFont.truetype("driver/source/regular.ttf", 49),
+            ImageFont.truetype("driver/source/medium.ttf", 70),
+        )
+    return _assets
+
+
+def _render(source: Optional[bytes], title: str, ctitle: str) -> BytesIO:
+    overlay, font, font2 = _load_assets()
+    if source:
+        background = changeImageSize(1280, 720, Image.open(BytesIO(source)))
+    else:
+        background = Image.new("RGBA", (1280, 720), "black")
+    img = Image.alpha_composite(background.convert("RGBA"), overlay)
+    draw = ImageDraw.Draw(img)
+    with _font_lock:
+        draw.text(
+            (30, 615),
+            f"{title[:20]}...",
+            fill="black",
+            font=font2,
+        )
+        draw.text(
+            (30, 543),
+            f"Playing on {ctitle[:12]}",
+            fill="black",
+            font=font,
+        )
+    final = BytesIO()
+    img.save(final, format="PNG")
+    final.name = "thumb.png"
+    final.seek(0)
+    return final
+
+
+async def _fetch(url: str) -> Optional[bytes]:
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
+    try:
+        async with _session.get(url) as resp:
+            if resp.status == 200:
+                return await resp.read()
+    except Exception as e:
+        print(f"⚠️  Thumbnail download failed: {e}")
+    return None
+
+
+def card_key(source_id: str, title: str, ctitle: str) -> str:
+    raw = "\0".join((str(TEMPLATE_VERSION), source_id, title[:20], ctitle[:12]))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _card_path(key: str) -> str:
+    return os.path.join(CARD_DIR, f"{key}.png")
+
+
+def _load_disk_index():
+    global _disk_loaded
+    os.makedirs(CARD_DIR, exist_ok=True)
+    entries = []
+    for name in os.listdir(CARD_DIR):
+        path = os.path.join(CARD_DIR, name)
+        if not os.path.isfile(path):
+            continue
+        stat = os.stat(path)
+        entries.append((stat.st_mtime, name[:-4], stat.st_size))
+    for _, key, size in sorted(entries):
+        _disk[key] = size
+    _disk_loaded = True
+
+
+def _read_card(key: str) -> Optional[bytes]:
+    with _disk_lock:
+        if not _disk_loaded:
+            _load_disk_index()
+        if key not in _disk:
+            return None
+        path = _card_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            _disk.pop(key, None)
+            return None
+        os.utime(path)
+        _disk.move_to_end(key)
+        return data
+
+
+def _write_card(key: str, data: bytes):
+    """Store a card on disk, evicting least recently used ones over quota."""
+    with _disk_lock:
+        if not _disk_loaded:
+            _load_disk_index()
+        with open(_card_path(key), "wb") as f:
+            f.write(data)
+        _disk[key] = len(data)
+        _disk.move_to_end(key)
+        quota = THUMB_CACHE_MB * 1024 * 1024
+        total = sum(_disk.values())
+        while total > quota and len(_disk) > 1:
+            old, size = _disk.popitem(last=False)
+            total -= size
+            try:
+                os.remove(_card_path(old))
+            except FileNotFoundError:
+                pass
+
+
+def _report_write_failure(future: asyncio.Future):
+    # nobody awaits the disk write, a full or read-only disk shows up here
+    if not future.cancelled() and future.exception() is not None:
+        print(f"⚠️  Thumbnail cache write failed: {future.exception()}")
+
+
+def _as_file(data: bytes) -> BytesIO:
+    final = BytesIO(data)
+    final.name = "thumb.png"
+    return final
+
+
+def card_stats() -> dict:
+    return {
+        **cards.stats(),
+        "disk_hits": disk_hits,
+        "disk_files": len(_disk),
+        "disk_bytes": sum(_disk.values()),
+    }
+
+
 async def thumb(thumbnail, title, userid, ctitle):
-    img_path = f"search/thumb{userid}.png"
+    """Render the now-playing card, returned as an in-memory PNG.
+
+    ``thumbnail`` is either an image url or a downloaded file, which is
+    consumed (deleted) once read. Cards are cached by (source, title, chat
+    title, template version); url sources are keyed by url so a hit skips
+    the download too, local files by their content.
+    """
+    global disk_hits
+    loop = asyncio.get_event_loop()
+    source = None
     if 'http' in thumbnail:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(thumbnail) as resp:
-                if resp.status == 200:
-                    f = await aiofiles.open(img_path, mode="wb")
-                    await f.write(await resp.read())
-                    await f.close()
+        source_id = thumbnail
     else:
-        img_path = thumbnail
-    image1 = Image.open(img_path)
-    image2 = Image.open("driver/source/LightGreen.png")
-    image3 = changeImageSize(1280, 720, image1)
-    image4 = changeImageSize(1280, 720, image2)
-    image5 = image3.convert("RGBA")
-    image6 = image4.convert("RGBA")
-    Image.alpha_composite(image5, image6).save(f"search/temp{userid}.png")
-    img = Image.open(f"search/temp{userid}.png")
-    draw = ImageDraw.Draw(img)
-    font = ImageFont.truetype("driver/source/regular.ttf", 49)
-    font2 = ImageFont.truetype("driver/source/medium.ttf", 70)
-    draw.text(
-        (30, 615),
-        f"{title[:20]}...",
-        fill="black",
-        font=font2,
-    )
-    draw.text(
-        (30, 543),
-        f"Playing on {ctitle[:12]}",
-        fill="black",
-        font=font,
-    )
-    img.save(f"search/final{userid}.png")
-    os.remove(f"search/temp{userid}.png")
-    os.remove(img_path)
-    final = f"search/final{userid}.png"
+        async with aiofiles.open(thumbnail, mode="rb") as f:
+            source = await f.read()
+        os.remove(thumbnail)
+        source_id = hashlib.sha256(source).hexdigest()
+    key = card_key(source_id, title, ctitle)
+
+    data = cards.get(key)
+    if data is None:
+        data = await loop.run_in_executor(_executor, _read_card, key)
+        if data is not None:
+            disk_hits += 1
+            cards.set(key, data)
+    if data is not None:
+        return _as_file(data)
+
+    if source is None:
+        source = await _fetch(thumbnail)
+    final = await loop.run_in_executor(_executor, _render, source, title, ctitle)
+    data = final.getvalue()
+    if source is not None:
+        # a failed download renders a placeholder, do not pin it in the cache
+        cards.set(key, data)
+        loop.run_in_executor(_executor, _write_card, key, data).add_done_callback(
+            _report_write_failure
+        )
     return final
@@ -0,0 +1,371 @@
+import asyncio
+from collections import Counter
+from time import monotonic, time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from uuid import uuid4
+
+from pyrogram.errors import FloodWait
+
+from config import BROADCAST_RATE, JOB_WORKERS, SHARD_ID
+from driver.database.dbjobs import get_unfinished_jobs, save_job, update_job
+
+# seconds between progress saves; after a crash a resumed job repeats at
+# most the targets finished within the last save interval
+SAVE_INTERVAL = 1
+# seconds between status message edits
+PROGRESS_INTERVAL = 10
+
+Handler = Callable[..., Awaitable[str]]
+
+
+def flood_wait_seconds(error: BaseException) -> Optional[float]:
+    """How long Telegram asked us to wait, or None if this is no FloodWait."""
+    if not isinstance(error, FloodWait):
+        return None
+    # pyrogram 2 calls it ``value``, pyrogram 1 ``x``
+    return float(getattr(error, "value", None) or getattr(error, "x", 0) or 1)
+
+
+class TokenBucket:
+    """Rate limiter shared by every job that talks to Telegram as the bot.
+
+    ``rate`` tokens per second refill up to ``burst``. A FloodWait pauses
+    the whole bucket, so every worker waits instead of each one running
+    into the same limit, and halves the rate; each success then adds a
+    little back until ``ceiling`` (additive increase, multiplicative
+    decrease).
+    """
+
+    def __init__(self, rate: float, burst: float, floor: float = 1.0):
+        self.rate = rate
+        self.ceiling = rate
+        self.floor = floor
+        self.burst = burst
+        self._tokens = burst
+        self._stamp = monotonic()
+        self._paused_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, monotonic() + seconds)
+        self._tokens = 0
+
+    def on_flood(self, seconds: float):
+        # workers in flight all hit the same limit; halve once per wait
+        if monotonic() >= self._paused_until:
+            self.rate = max(self.floor, self.rate / 2)
+        self.pause(seconds)
+
+    def on_success(self):
+        # +1 call/s for every ``rate`` successes, i.e. roughly each second
+        if self.rate < self.ceiling:
+            self.rate = min(self.ceiling, self.rate + 1 / self.rate)
+
+    async def acquire(self, tokens: float = 1):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    self._stamp = monotonic()
+                    continue
+                self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+limiter = TokenBucket(BROADCAST_RATE, burst=BROADCAST_RATE)
+
+# kind -> (handler, tokens per target, progress title)
+HANDLERS: Dict[str, Tuple[Handler, int, str]] = {}
+
+
+def job_handler(kind: str, cost: int = 1, title: str = ""):
+    """Register ``func(client, chat_id, payload) -> outcome`` for a job kind.
+
+    Handlers must be registered at import time so jobs found in the
+    database after a restart can be resumed. ``cost`` is the number of API
+    calls one target takes. Raise to count the target as failed.
+    """
+    def decorator(func: Handler) -> Handler:
+        HANDLERS[kind] = (func, cost, title or kind)
+        return func
+
+    return decorator
+
+
+class Job:
+    """One fan-out over a fixed list of chats.
+
+    Progress is a watermark (every target before it is finished) plus the
+    finished targets after it, so a resumed job skips every chat handled
+    up to the last save even though workers finish out of order. Progress
+    is saved every ``SAVE_INTERVAL``, so delivery is at-least-once: a
+    crash repeats at most the targets finished in that last second.
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        kind: str,
+        targets: List[int],
+        payload: dict,
+        status_chat: Optional[int] = None,
+        status_message: Optional[int] = None,
+        watermark: int = 0,
+        ahead: Iterable[int] = (),
+        counts: Optional[dict] = None,
+        created: Optional[float] = None,
+    ):
+        self.id = job_id
+        self.kind = kind
+        self.targets = targets
+        self.payload = payload
+        self.status_chat = status_chat
+        self.status_message = status_message
+        self.watermark = watermark
+        self.ahead: Set[int] = set(ahead)
+        self.counts = Counter(counts or {})
+        self.created = created or time()
+        self.status = "running"
+        self.task: Optional[asyncio.Task] = None
+        self._started = monotonic()
+        self._done_at_start = self.done
+
+    @property
+    def title(self) -> str:
+        return HANDLERS[self.kind][2] if self.kind in HANDLERS else self.kind
+
+    @property
+    def done(self) -> int:
+        return self.watermark + len(self.ahead)
+
+    def _finish(self, index: int):
+        self.ahead.add(index)
+        while self.watermark in self.ahead:
+            self.ahead.discard(self.watermark)
+            self.watermark += 1
+
+    def pending(self) -> Iterable[int]:
+        return (i for i in range(self.watermark, len(self.targets)) if i not in self.ahead)
+
+    def throughput(self) -> float:
+        elapsed = monotonic() - self._started
+        return (self.done - self._done_at_start) / elapsed if elapsed > 0 else 0.0
+
+    def to_doc(self) -> dict:
+        return {
+            "_id": self.id,
+            "kind": self.kind,
+            "targets": self.targets,
+            "payload": self.payload,
+            "status_chat": self.status_chat,
+            "status_message": self.status_message,
+            "watermark": self.watermark,
+            "ahead": sorted(self.ahead),
+            "counts": dict(self.counts),
+            "created": self.created,
+            "status": self.status,
+            "shard": SHARD_ID,
+        }
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "Job":
+        return cls(
+            doc["_id"],
+            doc["kind"],
+            doc["targets"],
+            doc["payload"],
+            doc.get("status_chat"),
+            doc.get("status_message"),
+            doc.get("watermark", 0),
+            doc.get("ahead", ()),
+            doc.get("counts"),
+            doc.get("created"),
+        )
+
+    def progress_text(self) -> str:
+        total = len(self.targets)
+        if not total:
+            return f"📣 **{self.title}** `{self.id}` — no target chats"
+        rate = self.throughput()
+        left = total - self.done
+        eta = f"{int(left / rate)}s" if rate > 0 and self.status == "running" else "-"
+        outcomes = ", ".join(f"{key}: `{value}`" for key, value in sorted(self.counts.items()))
+        header = self.payload.get("header")
+        return (
+            (f"{header}\n\n" if header else "")
+            + f"📣 **{self.title}** `{self.id}` — {self.status}\n\n"
+            f"**Progress :** `{self.done}/{total}` ({self.done / total:.0%})\n"
+            f"**Throughput :** `{rate:.1f}` chats/s, ETA `{eta}`\n"
+            f"**Outcomes :** {outcomes or '-'}"
+        )
+
+
+_jobs: Dict[str, Job] = {}
+_client = None
+
+
+async def _process(job: Job, handler: Handler, cost: int, index: int):
+    chat_id = job.targets[index]
+    while True:
+        await limiter.acquire(cost)
+        try:
+            outcome = await handler(_client, chat_id, job.payload)
+        except Exception as e:
+            wait = flood_wait_seconds(e)
+            if wait is None:
+                job.counts["failed"] += 1
+                break
+            # back off for everyone, then retry this same chat
+            job.counts["flood_waits"] += 1
+            limiter.on_flood(wait)
+            continue
+        limiter.on_success()
+        job.counts[outcome] += 1
+        break
+    job._finish(index)
+
+
+async def _save(job: Job):
+    await update_job(job.id, {k: v for k, v in job.to_doc().items() if k not in ("_id", "targets", "payload")})
+
+
+async def _report(job: Job):
+    await _save(job)
+    if job.status_chat and job.status_message and _client is not None:
+        try:
+            await _client.edit_message_text(job.status_chat, job.status_message, job.progress_text())
+        except Exception:
+            # "message not modified" and deleted status messages are fine
+            pass
+
+
+async def _reporter(job: Job):
+    saved = job.done
+    last_report = monotonic()
+    while True:
+        await asyncio.sleep(SAVE_INTERVAL)
+        try:
+            done = job.done
+            if monotonic() - last_report >= PROGRESS_INTERVAL:
+                last_report = monotonic()
+                await _report(job)
+            elif done != saved:
+                await _save(job)
+            saved = done
+        except Exception as e:
+            print(f"⚠️  Job {job.id} progress save failed: {e}")
+
+
+async def _run(job: Job):
+    handler, cost, _ = HANDLERS[job.kind]
+    pending = iter(list(job.pending()))
+
+    async def worker():
+        for index in pending:
+            await _process(job, handler, cost, index)
+
+    reporter = asyncio.get_event_loop().create_task(_reporter(job))
+    try:
+        await asyncio.gather(*(worker() for _ in range(JOB_WORKERS)))
+        job.status = "done"
+    except asyncio.CancelledError:
+        # cancel_job sets the status first; a shutdown leaves it running
+        raise
+    finally:
+        reporter.cancel()
+        try:
+            await _report(job)
+        except Exception as e:
+            print(f"⚠️  Job {job.id} progress save failed: {e}")
+        if job.status != "running":
+            _jobs.pop(job.id, None)
+
+
+def _launch(job: Job):
+    _jobs[job.id] = job
+    job.task = asyncio.get_event_loop().create_task(_run(job))
+
+
+async def start_job(client, kind: str, targets: List[int], payload: dict, status=None) -> Job:
+    """Persist a new job and start it in the background.
+
+    ``status`` is a message the job keeps edited with its progress.
+    """
+    global _client
+    _client = client
+    job = Job(
+        uuid4().hex[:8],
+        kind,
+        list(targets),
+        payload,
+        status.chat.id if status else None,
+        status.message_id if status else None,
+    )
+    await save_job(job.to_doc())
+    _launch(job)
+    return job
+
+
+async def resume_jobs(client) -> int:
+    """Restart every job that was still running when the bot went down."""
+    global _client
+    _client = client
+    resumed = 0
+    for doc in await get_unfinished_jobs(SHARD_ID):
+        if doc["_id"] in _jobs:
+            continue
+        if doc["kind"] not in HANDLERS:
+            print(f"⚠️  No handler for job {doc['_id']} ({doc['kind']}), leaving it")
+            continue
+        _launch(Job.from_doc(doc))
+        resumed += 1
+    return resumed
+
+
+async def suspend_jobs():
+    """Stop the workers for shutdown; jobs stay running in the database."""
+    for job in list(_jobs.values()):
+        if job.task:
+            job.task.cancel()
+            try:
+                await job.task
+            except asyncio.CancelledError:
+                pass
+    _jobs.clear()
+
+
+async def cancel_job(job_id: str) -> bool:
+    job = _jobs.get(job_id)
+    if job is None or job.task is None:
+        return False
+    job.status = "cancelled"
+    job.task.cancel()
+    try:
+        await job.task
+    except asyncio.CancelledError:
+        pass
+    return True
+
+
+def get_job(job_id: str) -> Optional[Job]:
+    return _jobs.get(job_id)
+
+
+def running_jobs() -> List[Job]:
+    return list(_jobs.values())
+
+
+def find_jobs(kind: str, **payload) -> List[Job]:
+    """Running jobs of ``kind`` whose payload has all the given values."""
+    return [
+        job
+        for job in _jobs.values()
+        if job.kind == kind and all(job.payload.get(k) == v for k, v in payload.items())
+    ]
@@ -0,0 +1,244 @@
+import asyncio
+import mimetypes
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+import aiofiles
+
+from config import MEDIA_CACHE_MB
+from driver.queues import files
+from driver.shards import shard_dir
+
+MEDIA_DIR = shard_dir(os.path.abspath("downloads/media"))
+MEDIA_KINDS = ("audio", "voice", "video", "document", "video_note")
+# marker sitting next to a file that is still being downloaded
+PARTIAL = ".partial"
+# seconds a growing file may go without new data before ffmpeg gives up
+STALL_TIMEOUT = 10
+
+
+def _media_of(message):
+    for kind in MEDIA_KINDS:
+        media = getattr(message, kind, None)
+        if media is not None:
+            return media
+    return None
+
+
+def _extension(media) -> str:
+    name = getattr(media, "file_name", None) or ""
+    ext = os.path.splitext(name)[1]
+    if not ext and getattr(media, "mime_type", None):
+        ext = mimetypes.guess_extension(media.mime_type) or ""
+    # keep user supplied names out of the path
+    return ext if ext[1:].isalnum() else ""
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _streamable(head: bytes) -> bool:
+    """Whether playback can start from the first bytes of a file.
+
+    Only MP4/MOV needs a look: with the index (``moov``) behind the media
+    data (``mdat``), ffmpeg has to seek to the end before the first frame.
+    """
+    if head[4:8] != b"ftyp":
+        return True
+    offset = 0
+    while offset + 8 <= len(head):
+        size = int.from_bytes(head[offset:offset + 4], "big")
+        kind = head[offset + 4:offset + 8]
+        if kind == b"moov":
+            return True
+        if kind == b"mdat":
+            return False
+        if size == 1:
+            size = int.from_bytes(head[offset + 8:offset + 16], "big")
+        if size < 8:
+            return False
+        offset += size
+    return False
+
+
+def _report_failure(task: asyncio.Task):
+    # a progressive requester may be gone by the time a download fails
+    if not task.cancelled() and task.exception() is not None:
+        print(f"⚠️  Media download failed: {task.exception()}")
+
+
+class _Download:
+    __slots__ = ("path", "ready", "task")
+
+    def __init__(self, path: str):
+        self.path = path
+        # True once the first chunk is written and playback may start
+        self.ready: asyncio.Future = asyncio.get_event_loop().create_future()
+        self.task: Optional[asyncio.Task] = None
+
+
+class MediaCache:
+    """Telegram media on disk, keyed by ``file_unique_id``.
+
+    The same voice note or video replayed in any chat is downloaded once;
+    requests for a file that is still downloading wait for that download
+    instead of starting another. Downloads stream into the final file
+    chunk by chunk, so playback can start while the file still grows.
+    Files are evicted least recently used first once the folder grows
+    past ``MEDIA_CACHE_MB``, skipping the ones a queue still points at.
+    Queue cleanup leaves cached files alone (see ``FileRegistry.manage``),
+    eviction is the only thing deleting them. ``on_complete(path)`` is
+    called once a download has finished, so streams started on the
+    growing file can move to the complete one.
+    """
+
+    def __init__(self, directory: str, quota: int):
+        self.directory = directory
+        self.quota = quota
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, _Download] = {}
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.progressive = 0
+        self.on_complete: Optional[Callable[[str], None]] = None
+
+    def load(self):
+        """Index the files kept from earlier runs."""
+        if self._loaded:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith((".temp", PARTIAL)) or not os.path.isfile(path):
+                continue
+            if os.path.exists(path + PARTIAL):
+                # cut short by a restart
+                os.remove(path)
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, os.path.splitext(name)[0], path, stat.st_size))
+        for _, key, path, size in sorted(entries):
+            self._entries[key] = (path, size)
+            files.manage(path)
+        self._loaded = True
+
+    def _lookup(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        path = entry[0]
+        if not os.path.exists(path):
+            del self._entries[key]
+            files.unmanage(path)
+            return None
+        self._entries.move_to_end(key)
+        os.utime(path)
+        return path
+
+    def _evict(self):
+        total = sum(size for _, size in self._entries.values())
+        for key, (path, size) in list(self._entries.items()):
+            if total <= self.quota:
+                break
+            if files.refcount(path) > 0:
+                continue
+            del self._entries[key]
+            files.unmanage(path)
+            total -= size
+            _remove(path)
+
+    async def _download(self, message, key: str, download: "_Download") -> str:
+        path = download.path
+        marker = path + PARTIAL
+        # a growing file may already sit in a queue, keep cleanup off it
+        files.manage(path)
+        open(marker, "w").close()
+        try:
+            async with aiofiles.open(path, mode="wb") as f:
+                async for chunk in message._client.stream_media(message):
+                    await f.write(chunk)
+                    await f.flush()
+                    if not download.ready.done():
+                        download.ready.set_result(_streamable(chunk))
+        except BaseException:
+            files.unmanage(path)
+            if files.refcount(path) == 0:
+                _remove(path)
+            raise
+        finally:
+            if not download.ready.done():
+                download.ready.set_result(False)
+            _remove(marker)
+            self._inflight.pop(key, None)
+        self._entries[key] = (path, os.path.getsize(path))
+        self._evict()
+        if self.on_complete is not None:
+            self.on_complete(path)
+        return path
+
+    async def fetch(self, message, progressive: bool = False) -> str:
+        """Local path of the media in ``message``, downloading it if needed.
+
+        With ``progressive`` the path comes back as soon as the first chunk
+        is on disk, unless the container cannot be played before it is
+        complete; check ``is_growing`` before handing it to ffmpeg.
+        """
+        self.load()
+        media = _media_of(message)
+        key = getattr(media, "file_unique_id", None)
+        if key is None:
+            return await message.download()
+        path = self._lookup(key)
+        if path is not None:
+            self.hits += 1
+            return path
+        download = self._inflight.get(key)
+        if download is not None:
+            self.shared += 1
+        else:
+            self.misses += 1
+            download = _Download(os.path.join(self.directory, key + _extension(media)))
+            self._inflight[key] = download
+            download.task = asyncio.ensure_future(self._download(message, key, download))
+            download.task.add_done_callback(_report_failure)
+        if progressive and await asyncio.shield(download.ready):
+            self.progressive += 1
+            return download.path
+        return await asyncio.shield(download.task)
+
+    def is_growing(self, path: str) -> bool:
+        return any(d.path == path for d in self._inflight.values())
+
+    def ffmpeg_parameters(self, path: str) -> str:
+        """Input options that let ffmpeg read ``path`` while it is written.
+
+        With these ffmpeg only stops ``STALL_TIMEOUT`` after the last byte,
+        so whoever uses them restarts the stream on ``on_complete``.
+        """
+        if not self.is_growing(path):
+            return ""
+        # keep reading at EOF, give up once no data came for STALL_TIMEOUT
+        return f"-follow 1 -rw_timeout {STALL_TIMEOUT * 1000000}"
+
+    def stats(self) -> dict:
+        return {
+            "files": len(self._entries),
+            "bytes": sum(size for _, size in self._entries.values()),
+            "quota": self.quota,
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "progressive": self.progressive,
+            "downloading": len(self._inflight),
+        }
+
+
+media_cache = MediaCache(MEDIA_DIR, MEDIA_CACHE_MB * 1024 * 1024)
@@ -0,0 +1,70 @@
+import asyncio
+from time import time
+from typing import Dict
+
+import aiohttp
+
+from driver.queues import QUEUE, QueueItem, get_queue, snapshots
+from driver.resolver import url_expiry, ytdl
+
+# a stream url is trusted for playback only if it outlives this margin,
+# which covers waiting for the current track plus playing the next one
+FRESH_MARGIN = 2 * 60 * 60
+# at changeover the url only has to outlive the track it is about to play
+PLAY_MARGIN = 60 * 60
+PROBE_TIMEOUT = aiohttp.ClientTimeout(total=5)
+
+_tasks: Dict[int, asyncio.Task] = {}
+
+
+def is_fresh(item: QueueItem, margin: float = FRESH_MARGIN) -> bool:
+    if item.is_local:
+        return True
+    expiry = url_expiry(item.link)
+    return expiry is not None and expiry - time() > margin
+
+
+async def _probe(url: str) -> bool:
+    try:
+        async with aiohttp.ClientSession(timeout=PROBE_TIMEOUT) as session:
+            async with session.head(url, allow_redirects=True) as resp:
+                return resp.status < 400
+    except Exception:
+        return False
+
+
+async def refresh(item: QueueItem) -> bool:
+    """Re-resolve the stream url of ``item`` in place. Returns success."""
+    ok, url = await ytdl(item.ref, force=True)
+    if not ok:
+        print(f"⚠️  Could not re-resolve {item.ref}: {url}")
+        return False
+    item.link = url
+    return True
+
+
+async def _prefetch(chat_id: int):
+    try:
+        checked = None
+        # loop so a skip that happens mid-prefetch still gets its new next item warmed
+        while True:
+            chat_queue = get_queue(chat_id)
+            if not chat_queue or len(chat_queue) < 2:
+                return
+            item = chat_queue[1]
+            if item is checked or item.is_local:
+                return
+            if not (is_fresh(item) and await _probe(item.link)):
+                if await refresh(item) and chat_id in QUEUE:
+                    snapshots.mark(chat_id)
+            checked = item
+    finally:
+        _tasks.pop(chat_id, None)
+
+
+def prefetch_next(chat_id: int):
+    """Validate, and if needed re-resolve, the next item in the background."""
+    task = _tasks.get(chat_id)
+    if task and not task.done():
+        return
+    _tasks[chat_id] = asyncio.get_event_loop().create_task(_prefetch(chat_id))
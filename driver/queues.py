@@ -1,54 +1,200 @@
-from os import remove
+from collections import deque
+from os import path, remove
+from sys import getsizeof
+from typing import Deque, Dict, Iterable, Optional, Set
 
-QUEUE = {}
+from driver.database.dbqueue import load_queue_snapshots, save_queue_snapshots
+from driver.shards import owns
+from driver.writebehind import WriteBehind
 
 
-def clean_trash(file_name: str, cid: int, clear_all: bool = False):
-    for i in QUEUE:
-        chat_queue = QUEUE[i][1:] if (i == cid and (not clear_all)) else QUEUE[i]
-        for f in chat_queue:
-            if f[1] == file_name:
-                file_name = None
-                break
-    if file_name:
+class QueueItem:
+    """A single queued stream: what to play, where it came from and how."""
+
+    __slots__ = ("songname", "link", "ref", "type", "quality")
+
+    def __init__(self, songname: str, link: str, ref: str, type: str, quality: int):
+        self.songname = songname
+        self.link = link        # playable source: stream url or local file path
+        self.ref = ref          # public reference: youtube url or t.me message link
+        self.type = type        # "music" or "video"
+        self.quality = quality  # video height (720/480/360), 0 for music
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QueueItem":
+        return cls(*(data[field] for field in cls.__slots__))
+
+    @property
+    def is_local(self) -> bool:
+        return "t.me" in self.ref
+
+    def __repr__(self):
+        return f"QueueItem({self.songname!r}, {self.type!r}, {self.quality!r})"
+
+
+class FileRegistry:
+    """Reference counts for downloaded media files referenced by queues.
+
+    A file is deleted from disk exactly when the last queue item that
+    points at it is popped, skipped or cleared, no matter which chat
+    holds the other references. Files handed to ``manage`` belong to
+    someone else (the media cache) and are only ever counted, never
+    deleted here.
+    """
+
+    def __init__(self):
+        self._refs: Dict[str, int] = {}
+        self._managed: Set[str] = set()
+
+    def manage(self, path: str):
+        self._managed.add(path)
+
+    def unmanage(self, path: str):
+        self._managed.discard(path)
+
+    def retain(self, path: str):
+        self._refs[path] = self._refs.get(path, 0) + 1
+
+    def release(self, path: str):
+        count = self._refs.get(path, 0) - 1
+        if count > 0:
+            self._refs[path] = count
+            return
+        self._refs.pop(path, None)
+        if path in self._managed:
+            return
         try:
-            remove(file_name)
+            remove(path)
         except FileNotFoundError:
             pass
 
+    def refcount(self, path: str) -> int:
+        return self._refs.get(path, 0)
+
+    def __len__(self):
+        return len(self._refs)
+
+
+async def _persist(chat_ids: Set[int]):
+    await save_queue_snapshots(
+        {
+            chat_id: [item.to_dict() for item in QUEUE[chat_id]] if QUEUE.get(chat_id) else None
+            for chat_id in chat_ids
+        }
+    )
+
+
+QUEUE: Dict[int, Deque[QueueItem]] = {}
+files = FileRegistry()
+snapshots = WriteBehind(_persist, interval=3.0, name="queue snapshots")
+
+
+def _release(item: QueueItem):
+    if item.is_local:
+        files.release(item.link)
+
 
 def add_to_queue(chat_id, songname, link, ref, type, quality):
-   if chat_id in QUEUE:
-      chat_queue = QUEUE[chat_id]
-      chat_queue.append([songname, link, ref, type, quality])
-      return int(len(chat_queue) -1)
-   else:
-      QUEUE[chat_id] = [[songname, link, ref, type, quality]]
+    item = QueueItem(songname, link, ref, type, quality)
+    if item.is_local:
+        files.retain(link)
+    if chat_id in QUEUE:
+        chat_queue = QUEUE[chat_id]
+        chat_queue.append(item)
+        snapshots.mark(chat_id)
+        return int(len(chat_queue) - 1)
+    else:
+        QUEUE[chat_id] = deque([item])
+        snapshots.mark(chat_id)
 
 
 def get_queue(chat_id):
-   if chat_id in QUEUE:
-      chat_queue = QUEUE[chat_id]
-      return chat_queue
-   else:
-      return 0
+    if chat_id in QUEUE:
+        chat_queue = QUEUE[chat_id]
+        return chat_queue
+    else:
+        return 0
 
 
 def pop_an_item(chat_id):
-   if chat_id in QUEUE:
-      chat_queue = QUEUE[chat_id]
-      chat_queue.pop(0)
-      return 1
-   else:
-      return 0
+    if chat_id in QUEUE:
+        chat_queue = QUEUE[chat_id]
+        _release(chat_queue.popleft())
+        snapshots.mark(chat_id)
+        return 1
+    else:
+        return 0
+
+
+def remove_from_queue(chat_id, index: int) -> Optional[QueueItem]:
+    """Remove and return the item at ``index``, or None if there is none."""
+    chat_queue = QUEUE.get(chat_id)
+    if not chat_queue or not 0 <= index < len(chat_queue):
+        return None
+    item = chat_queue[index]
+    del chat_queue[index]
+    _release(item)
+    snapshots.mark(chat_id)
+    return item
 
 
 def clear_queue(chat_id):
-   if chat_id in QUEUE:
-      for i in QUEUE[chat_id]:
-         if "t.me" in i[2]:
-            clean_trash(i[1], chat_id, True)
-      QUEUE.pop(chat_id)
-      return 1
-   else:
-      return 0
+    if chat_id in QUEUE:
+        for item in QUEUE.pop(chat_id):
+            _release(item)
+        snapshots.mark(chat_id)
+        return 1
+    else:
+        return 0
+
+
+async def restore_queues() -> Iterable[int]:
+    """Rebuild QUEUE from the persisted snapshots with a single bulk read.
+
+    Items whose downloaded file did not survive the restart are dropped,
+    and so are other shards' chats.
+    Returns the ids of the chats that got a queue back.
+    """
+    for chat_id, items in (await load_queue_snapshots()).items():
+        if not owns(chat_id):
+            continue
+        chat_queue = deque()
+        for data in items:
+            item = QueueItem.from_dict(data)
+            if item.is_local:
+                if not path.exists(item.link):
+                    continue
+                files.retain(item.link)
+            chat_queue.append(item)
+        if chat_queue:
+            QUEUE[chat_id] = chat_queue
+        else:
+            snapshots.mark(chat_id)
+    return list(QUEUE)
+
+
+def queue_memory(chat_id) -> int:
+    """Approximate number of bytes held by one chat's queue state."""
+    chat_queue = QUEUE.get(chat_id)
+    if chat_queue is None:
+        return 0
+    size = getsizeof(chat_queue)
+    for item in chat_queue:
+        size += getsizeof(item)
+        for field in QueueItem.__slots__:
+            size += getsizeof(getattr(item, field))
+    return size
+
+
+def queue_stats() -> dict:
+    """Totals across every chat, for the sudo metrics command."""
+    per_chat = {chat_id: queue_memory(chat_id) for chat_id in list(QUEUE)}
+    return {
+        "chats": len(per_chat),
+        "items": sum(len(q) for q in QUEUE.values()),
+        "bytes": sum(per_chat.values()) + getsizeof(QUEUE),
+        "largest": max(per_chat.items(), key=lambda kv: kv[1], default=None),
+    }
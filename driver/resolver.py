@@ -0,0 +1,214 @@
+import asyncio
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from time import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from yt_dlp import YoutubeDL
+
+from cache.lru import TTLCache
+from config import RESOLVER_QUEUE, RESOLVER_TIMEOUT, RESOLVER_WORKERS
+
+# best progressive stream that fits the 720p video quality preset
+YTDL_FORMAT = "[height<=?720][width<=?1280]"
+# cached urls are served only while they have at least this long to live,
+# so anything handed out is still fresh by the prefetcher's standards
+MIN_REMAINING = 2 * 60 * 60 + 5 * 60
+# for urls that do not advertise an expiry
+DEFAULT_TTL = 5 * 60
+# duration and live status outlive the url they came with
+DETAILS_TTL = 24 * 60 * 60
+
+_VIDEO_ID = re.compile(r"(?:v=|youtu\.be/|shorts/|embed/|live/)([\w-]{11})")
+
+resolved = TTLCache(maxsize=2048, ttl=DEFAULT_TTL)
+details = TTLCache(maxsize=4096, ttl=DETAILS_TTL)
+_inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+
+
+def video_id(link: str) -> str:
+    match = _VIDEO_ID.search(link)
+    return match.group(1) if match else link
+
+
+async def ytdl(link: str, format: str = YTDL_FORMAT, force: bool = False):
+    """Resolve ``link`` to a direct stream url, returning ``(ok, url_or_error)``.
+
+    Results are shared across chats, keyed by (video id, format), and kept
+    until shortly before the url's own expiry. Concurrent requests for the
+    same key wait on one resolution. ``force`` skips the cached url.
+    """
+    key = (video_id(link), format)
+    if force:
+        resolved.pop(key)
+    else:
+        url = resolved.get(key)
+        if url:
+            return 1, url
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.get_event_loop().create_task(_resolve_and_cache(key, link, format))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # shielded so one impatient caller cannot cancel everyone's resolution
+    return await asyncio.shield(task)
+
+
+async def _resolve_and_cache(key: Tuple[str, str], link: str, format: str):
+    result = await _resolve(link, format)
+    if result[0]:
+        resolved.set(key, result[1], ttl=_cache_ttl(result[1]))
+        details.set(key[0], result[2])
+    return result[:2]
+
+
+def track_details(link: str) -> Optional[Tuple[Optional[float], bool]]:
+    """``(duration, is_live)`` of a track resolved earlier, if still known."""
+    return details.get(video_id(link))
+
+
+def _cache_ttl(url: str) -> float:
+    expiry = url_expiry(url)
+    if expiry is None:
+        return DEFAULT_TTL
+    return expiry - time() - MIN_REMAINING
+
+
+# one YoutubeDL per format selector, living as long as its worker process
+_ydl: Dict[str, YoutubeDL] = {}
+
+
+def _get_ydl(format: str) -> YoutubeDL:
+    ydl = _ydl.get(format)
+    if ydl is None:
+        ydl = _ydl[format] = YoutubeDL(
+            {
+                "format": format,
+                "geo_bypass": True,
+                "noplaylist": True,
+                "quiet": True,
+                "no_warnings": True,
+                "socket_timeout": 10,
+            }
+        )
+    return ydl
+
+
+def _warm_up(format: str = YTDL_FORMAT):
+    _get_ydl(format)
+
+
+def _extract(link: str, format: str):
+    """Runs inside a pool worker: ``(0, error)`` or ``(1, url, (duration, is_live))``."""
+    try:
+        info = _get_ydl(format).extract_info(link, download=False)
+    except Exception as e:
+        return 0, str(e)
+    if info.get("entries"):
+        info = info["entries"][0]
+    url = info.get("url")
+    if not url and info.get("requested_formats"):
+        url = info["requested_formats"][0].get("url")
+    if not url:
+        return 0, "no playable stream found"
+    return 1, url, (info.get("duration"), bool(info.get("is_live")))
+
+
+class ExtractorPool:
+    """Warm yt-dlp extractors in worker processes, behind a bounded queue.
+
+    Resolving in a warm worker skips interpreter startup and extractor
+    import, which is most of the cost of running the yt-dlp cli per play.
+    """
+
+    def __init__(self, workers: int, max_pending: int, timeout: float):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        """Fork the workers and build their extractors ahead of the first play.
+
+        Called before the clients start so the workers are forked from a
+        process that is not yet running the network threads.
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            for _ in range(self.workers):
+                self._executor.submit(_warm_up)
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _release(self, future: asyncio.Future):
+        self.pending -= 1
+        if not future.cancelled():
+            # retrieved here so a timed out job that later fails stays quiet
+            future.exception()
+
+    async def resolve(self, link: str, format: str):
+        if self.pending >= self.workers + self.max_pending:
+            self.rejected += 1
+            return 0, "resolver is busy, try again in a moment"
+        self.start()
+        try:
+            future = asyncio.get_event_loop().run_in_executor(
+                self._executor, _extract, link, format
+            )
+        except BrokenProcessPool:
+            self._executor = None
+            return 0, "resolver worker crashed, try again"
+        # the slot stays taken until the worker is really done with the job,
+        # not just until we stop waiting for it
+        self.pending += 1
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            # the worker finishes on its own thanks to socket_timeout
+            self.timeouts += 1
+            return 0, f"resolving timed out after {self.timeout:.0f}s"
+        except BrokenProcessPool:
+            self._executor = None
+            return 0, "resolver worker crashed, try again"
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+
+pool = ExtractorPool(RESOLVER_WORKERS, RESOLVER_QUEUE, RESOLVER_TIMEOUT)
+
+
+async def _resolve(link: str, format: str):
+    return await pool.resolve(link, format)
+
+
+def url_expiry(url: str) -> Optional[float]:
+    """Unix time a resolved googlevideo url stops working, if it says so."""
+    parsed = urlparse(url)
+    expire = parse_qs(parsed.query).get("expire")
+    if expire:
+        value = expire[0]
+    else:
+        # manifest urls carry it as a path segment: .../expire/1700000000/...
+        parts = parsed.path.split("/")
+        if "expire" not in parts or parts.index("expire") + 1 >= len(parts):
+            return None
+        value = parts[parts.index("expire") + 1]
+    try:
+        return float(value)
+    except ValueError:
+        return None
@@ -0,0 +1,122 @@
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+from youtubesearchpython import VideosSearch
+
+from cache.lru import TTLCache
+from config import SEARCH_CONCURRENCY, SEARCH_TIMEOUT
+
+# arabic harakat, quranic marks and the tatweel stretch character
+_ARABIC_MARKS = re.compile("[\u0610-\u061a\u0640\u064b-\u065f\u0670\u06d6-\u06ed]")
+_SPACES = re.compile(r"\s+")
+
+# normalized query -> (results, limit they were fetched with)
+results_cache = TTLCache(maxsize=2048, ttl=30 * 60)
+hits = 0
+misses = 0
+# normalized query -> (limit, task) of the provider call currently running
+_inflight: Dict[str, Tuple[int, asyncio.Task]] = {}
+
+# provider calls are blocking http requests, keep them off the event loop
+_executor = ThreadPoolExecutor(max_workers=SEARCH_CONCURRENCY, thread_name_prefix="search")
+_slots: Optional[asyncio.Semaphore] = None
+
+
+def _search_videos(query: str, limit: int) -> List[dict]:
+    return VideosSearch(query, limit=limit).result()["result"]
+
+
+def normalize_query(query: str) -> str:
+    """Fold the spelling differences that do not change what users mean."""
+    query = _ARABIC_MARKS.sub("", query.casefold())
+    return _SPACES.sub(" ", query).strip()
+
+
+async def search(query: str, limit: int = 1) -> List[dict]:
+    """Search YouTube without blocking the event loop.
+
+    Returns the provider's result dicts (``title``, ``link``, ``id``,
+    ``duration``, ``viewCount``, ``channel``, ``thumbnails`` ...), or an
+    empty list when the search fails or times out. Answers are cached by
+    normalized query, and a cached answer fetched with a larger limit also
+    serves smaller ones. Identical queries already in flight are awaited
+    rather than sent again.
+    """
+    global hits, misses
+    key = normalize_query(query)
+    cached = results_cache.get(key)
+    if cached is not None:
+        results, fetched_limit = cached
+        # a short answer to a big request means there is nothing more to find
+        if fetched_limit >= limit or len(results) < fetched_limit:
+            hits += 1
+            return results[:limit]
+    running = _inflight.get(key)
+    if running is not None and running[0] >= limit:
+        hits += 1
+        results = await asyncio.shield(running[1])
+        return results[:limit]
+    misses += 1
+    task = asyncio.get_event_loop().create_task(_fetch_and_cache(key, limit))
+    _inflight[key] = (limit, task)
+    task.add_done_callback(partial(_forget, key))
+    return await asyncio.shield(task)
+
+
+def _forget(key: str, task: asyncio.Task):
+    # a bigger search for the same query may have replaced this one meanwhile
+    running = _inflight.get(key)
+    if running is not None and running[1] is task:
+        del _inflight[key]
+
+
+async def _fetch_and_cache(key: str, limit: int) -> List[dict]:
+    results = await _fetch(key, limit)
+    if results:
+        results_cache.set(key, (results, limit))
+    return results
+
+
+def search_stats() -> dict:
+    lookups = hits + misses
+    return {
+        "size": len(results_cache),
+        "maxsize": results_cache.maxsize,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / lookups if lookups else 0.0,
+    }
+
+
+async def _fetch(query: str, limit: int) -> List[dict]:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(SEARCH_CONCURRENCY)
+    async with _slots:
+        try:
+            return await asyncio.wait_for(
+                asyncio.get_event_loop().run_in_executor(
+                    _executor, _search_videos, query, limit
+                ),
+                SEARCH_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            print(f"⚠️  Search timed out: {query!r}")
+        except Exception as e:
+            print(f"⚠️  Search failed: {query!r}: {e}")
+    return []
+
+
+async def ytsearch(query: str):
+    results = await search(query, limit=1)
+    if not results:
+        return 0
+    data = results[0]
+    songname = data["title"]
+    url = data["link"]
+    duration = data["duration"]
+    thumbnail = data["thumbnails"][0]["url"]
+    return [songname, url, duration, thumbnail]
@@ -0,0 +1,108 @@
+"""Chat partitioning between worker processes and the pub/sub link
+they share through the coordinator (see ``cluster.py``).
+
+Only ``UPDATES_SHARD``'s bot connection receives updates; it hands the
+ones for other shards' chats to the coordinator with ``route``, which
+passes each to its owner alone (see ``program/sharding.py``).
+
+With ``SHARD_COUNT`` at 1 (the default) this process owns every chat and
+publishing is a no-op, which is the plain single-process bot.
+"""
+
+import asyncio
+import os
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from config import SHARD_COUNT, SHARD_ID
+
+# messages waiting for the coordinator before new ones are dropped
+OUTBOX_LIMIT = 10000
+# the shard whose bot connection receives every update
+UPDATES_SHARD = 0
+# topic the coordinator delivers to one shard instead of relaying to all
+ROUTE_TOPIC = "_route"
+
+_conn = None
+_outbox: Optional[queue.Queue] = None
+_subscribers: Dict[str, List[Callable[[Any], None]]] = {}
+dropped = 0
+
+
+def shard_of(chat_id: int) -> int:
+    return abs(chat_id) % SHARD_COUNT if SHARD_COUNT > 1 else 0
+
+
+def owns(chat_id: int) -> bool:
+    return shard_of(chat_id) == SHARD_ID
+
+
+def shard_dir(path: str) -> str:
+    """This shard's own folder under ``path``, so caches never evict or
+    clean up files another shard is still using."""
+    return os.path.join(path, f"shard-{SHARD_ID}") if SHARD_COUNT > 1 else path
+
+
+def _writer(conn, outbox: queue.Queue):
+    while True:
+        message = outbox.get()
+        try:
+            conn.send(message)
+        except (BrokenPipeError, EOFError, OSError) as e:
+            print(f"⚠️  Shard {SHARD_ID} lost the coordinator: {e}")
+            return
+
+
+def attach(conn):
+    """Connect this worker to the coordinator's end of a Pipe."""
+    global _conn, _outbox
+    _conn = conn
+    _outbox = queue.Queue(maxsize=OUTBOX_LIMIT)
+    # a pipe the coordinator is slow to drain must not block the event loop
+    threading.Thread(target=_writer, args=(conn, _outbox), name="shard-link", daemon=True).start()
+
+
+def subscribe(topic: str, callback: Callable[[Any], None]):
+    _subscribers.setdefault(topic, []).append(callback)
+
+
+def _send(message: tuple):
+    global dropped
+    if _outbox is None:
+        return
+    try:
+        _outbox.put_nowait(message)
+    except queue.Full:
+        # the periodic reconcile of the mirrored sets catches up later
+        dropped += 1
+        if dropped % 1000 == 1:
+            print(f"⚠️  Shard {SHARD_ID} coordinator link is full, dropped {dropped} updates")
+
+
+def publish(topic: str, payload: Any):
+    """Tell every other shard about a change this one just made."""
+    _send((topic, payload))
+
+
+def route(shard_id: int, payload: Any):
+    """Hand ``payload`` to the ``ROUTE_TOPIC`` subscribers of one shard."""
+    _send((ROUTE_TOPIC, (shard_id, payload)))
+
+
+async def listen():
+    """Apply changes published by the other shards until the pipe closes."""
+    if _conn is None:
+        return
+    loop = asyncio.get_event_loop()
+    while True:
+        try:
+            topic, payload = await loop.run_in_executor(None, _conn.recv)
+        except (EOFError, OSError):
+            print(f"⚠️  Shard {SHARD_ID} coordinator link closed")
+            return
+        for callback in _subscribers.get(topic, ()):
+            try:
+                callback(payload)
+            except Exception as e:
+                print(f"⚠️  Shard {SHARD_ID} {topic} update failed: {e}")
@@ -0,0 +1,225 @@
+import asyncio
+import os
+from time import monotonic, time
+from typing import Dict, List, Optional
+
+import psutil
+
+from config import FFMPEG_MAX_PROCS, FFMPEG_SAMPLE_INTERVAL
+from driver.queues import QUEUE
+from driver.transcode import TRANSCODE_DIR, transcoder
+
+# seconds an ffmpeg may outlive its chat's queue before it is killed;
+# covers a stream that started before its queue item was added
+ORPHAN_GRACE = 30
+# background transcodes write to tmp.* in the transcode folder
+TRANSCODE_PREFIX = os.path.join(TRANSCODE_DIR, "tmp.")
+
+
+class StreamLimitReached(Exception):
+    """Raised instead of joining a call while ffmpeg is at its cap."""
+
+
+class FFmpegProcess:
+    __slots__ = ("process", "kind", "chat_id", "cpu", "rss", "orphaned_since", "suspended")
+
+    def __init__(self, process: psutil.Process):
+        self.process = process
+        self.kind = "stream"
+        self.chat_id: Optional[int] = None
+        self.cpu = 0.0
+        self.rss = 0
+        self.orphaned_since: Optional[float] = None
+        self.suspended = False
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    @property
+    def age(self) -> float:
+        try:
+            return max(0.0, time() - self.process.create_time())
+        except psutil.NoSuchProcess:
+            return 0.0
+
+
+def _input_of(cmdline: List[str]) -> str:
+    for flag, value in zip(cmdline, cmdline[1:]):
+        if flag == "-i":
+            return value
+    return ""
+
+
+def _owner(source: str, sources: Dict[str, int]) -> Optional[int]:
+    owner = sources.get(source)
+    if owner is None and source:
+        # tolerate protocol prefixes and the like around the path
+        owner = next((chat_id for known, chat_id in sources.items() if known in source), None)
+    return owner
+
+
+def _sources() -> Dict[str, int]:
+    """What each chat is playing right now, as ffmpeg would see it.
+
+    Only used to label processes: a video call runs two ffmpeg on the
+    same input, and chats playing the same file share one label.
+    """
+    sources: Dict[str, int] = {}
+    for chat_id, chat_queue in list(QUEUE.items()):
+        if not chat_queue:
+            continue
+        item = chat_queue[0]
+        for source in (item.link, transcoder.path_for(item)):
+            if source:
+                sources.setdefault(source, chat_id)
+    return sources
+
+
+def _expected_processes(skip: Optional[int] = None) -> int:
+    """ffmpeg the current calls need: one for audio, two for video."""
+    return sum(
+        2 if chat_queue[0].type == "video" else 1
+        for chat_id, chat_queue in list(QUEUE.items())
+        if chat_queue and chat_id != skip
+    )
+
+
+class Supervisor:
+    """Keeps an eye on the ffmpeg processes behind every call.
+
+    Each sample walks this process's children, attributes every ffmpeg to
+    the chat whose current queue item it reads, and records its CPU and
+    memory. A stream whose chat has been gone from ``QUEUE`` for
+    ``ORPHAN_GRACE`` seconds is killed; one that matches no chat is only
+    reported. ``FFMPEG_MAX_PROCS`` caps ffmpeg processes as a whole: at
+    the cap new calls are refused (see ``admit``) and background
+    transcodes are suspended until streams end.
+    """
+
+    def __init__(self):
+        self._procs: Dict[int, FFmpegProcess] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.killed = 0
+        self.refused = 0
+
+    def _scan(self):
+        seen = set()
+        sources = _sources()
+        for child in psutil.Process(os.getpid()).children(recursive=True):
+            try:
+                if "ffmpeg" not in child.name():
+                    continue
+                entry = self._procs.get(child.pid)
+                if entry is None:
+                    entry = self._procs[child.pid] = FFmpegProcess(child)
+                    # the first reading only sets the baseline
+                    child.cpu_percent(None)
+                else:
+                    entry.cpu = child.cpu_percent(None)
+                entry.rss = child.memory_info().rss
+                cmdline = child.cmdline()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            seen.add(child.pid)
+            if cmdline and cmdline[-1].startswith(TRANSCODE_PREFIX):
+                entry.kind = "transcode"
+                continue
+            owner = _owner(_input_of(cmdline), sources)
+            if owner is not None:
+                # kept when the queue moves on, so a leftover is still traced
+                entry.chat_id = owner
+        for pid in set(self._procs) - seen:
+            del self._procs[pid]
+
+    def _reap(self):
+        now = monotonic()
+        for entry in list(self._procs.values()):
+            if entry.kind != "stream" or entry.chat_id is None:
+                continue
+            if entry.chat_id in QUEUE:
+                entry.orphaned_since = None
+                continue
+            if entry.orphaned_since is None:
+                entry.orphaned_since = now
+            elif now - entry.orphaned_since >= ORPHAN_GRACE:
+                print(f"⚠️  Killing orphaned ffmpeg {entry.pid} of chat {entry.chat_id}")
+                try:
+                    entry.process.kill()
+                    self.killed += 1
+                except psutil.NoSuchProcess:
+                    pass
+                del self._procs[entry.pid]
+
+    def _streams(self, skip: Optional[int] = None) -> int:
+        measured = sum(1 for e in self._procs.values() if e.kind == "stream")
+        # between samples new calls are known only from their queues
+        return max(measured, _expected_processes(skip))
+
+    def _throttle(self):
+        room = FFMPEG_MAX_PROCS - self._streams()
+        for entry in self._procs.values():
+            if entry.kind != "transcode":
+                continue
+            try:
+                if room > 0 and entry.suspended:
+                    entry.process.resume()
+                    entry.suspended = False
+                elif room <= 0 and not entry.suspended:
+                    entry.process.suspend()
+                    entry.suspended = True
+            except psutil.NoSuchProcess:
+                continue
+            if not entry.suspended:
+                room -= 1
+
+    def sample(self):
+        self._scan()
+        self._reap()
+        self._throttle()
+
+    async def _run(self):
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"⚠️  ffmpeg supervisor error: {e}")
+            await asyncio.sleep(FFMPEG_SAMPLE_INTERVAL)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def admit(self, chat_id: int):
+        """Refuse a new call once ffmpeg is at its cap."""
+        # a resumed chat may be queued already, it is the call being admitted
+        if self._streams(chat_id) >= FFMPEG_MAX_PROCS:
+            self.refused += 1
+            raise StreamLimitReached(f"{FFMPEG_MAX_PROCS} ffmpeg processes are already running")
+
+    def processes(self) -> List[FFmpegProcess]:
+        return sorted(self._procs.values(), key=lambda e: e.cpu, reverse=True)
+
+    def stats(self) -> dict:
+        entries = list(self._procs.values())
+        return {
+            "streams": sum(1 for e in entries if e.kind == "stream"),
+            "calls": len([q for q in QUEUE.values() if q]),
+            "transcodes": sum(1 for e in entries if e.kind == "transcode"),
+            "suspended": sum(1 for e in entries if e.suspended),
+            "unowned": sum(1 for e in entries if e.kind == "stream" and e.chat_id is None),
+            "orphaned": sum(1 for e in entries if e.orphaned_since is not None),
+            "cpu": sum(e.cpu for e in entries),
+            "rss": sum(e.rss for e in entries),
+            "cap": FFMPEG_MAX_PROCS,
+            "killed": self.killed,
+            "refused": self.refused,
+        }
+
+
+supervisor = Supervisor()
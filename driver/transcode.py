@@ -0,0 +1,271 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from time import monotonic
+from typing import Dict, List, Optional, Set
+
+from cache.lru import TTLCache
+from config import (
+    TRANSCODE_CACHE_MB,
+    TRANSCODE_MAX_DURATION,
+    TRANSCODE_MIN_PLAYS,
+    TRANSCODE_WORKERS,
+)
+from driver.mediacache import media_cache
+from driver.queues import QueueItem
+from driver.resolver import track_details, ytdl
+from driver.shards import shard_dir
+
+TRANSCODE_DIR = shard_dir(os.path.abspath("downloads/transcoded"))
+# plays counted towards admission within this many seconds of the first
+POPULARITY_WINDOW = 24 * 60 * 60
+# seconds ffprobe gets to read a source's duration
+PROBE_TIMEOUT = 30
+
+# the same rates and sizes PyTgCalls feeds into a call, so its ffmpeg only
+# has to decode: 48 kHz stereo opus for HighQualityAudio and frames already
+# scaled for the video qualities at their frame rate
+AUDIO_ARGS = ["-c:a", "libopus", "-b:a", "128k", "-ar", "48000", "-ac", "2"]
+VIDEO_SIZES = {720: 720, 480: 480, 360: 360}
+VIDEO_FPS = 20
+# generous bits per second of each variant; a job may write its duration's
+# worth and an output that reaches that is dropped as cut short
+MAX_BITRATES = {"audio": 192000, "720p": 4000000, "480p": 2500000, "360p": 1500000}
+
+
+def _variant(item: QueueItem) -> str:
+    if item.type == "video":
+        return f"{item.quality if item.quality in VIDEO_SIZES else 720}p"
+    return "audio"
+
+
+def _ffmpeg_args(source: str, variant: str, target: str, limit: int) -> List[str]:
+    args = ["ffmpeg", "-nostdin", "-y", "-loglevel", "error", "-i", source]
+    if variant == "audio":
+        args += ["-vn", *AUDIO_ARGS]
+    else:
+        height = VIDEO_SIZES[int(variant[:-1])]
+        args += [
+            "-vf", f"scale=-2:{height}",
+            "-r", str(VIDEO_FPS),
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
+            *AUDIO_ARGS,
+        ]
+    # hard stops in case the probe was wrong: never past the longest
+    # admitted track, never past the disk this job was given
+    return args + ["-t", str(TRANSCODE_MAX_DURATION), "-fs", str(limit), target]
+
+
+def _admissible(item: QueueItem) -> bool:
+    """Whether ``item`` is a finite track short enough to prepare."""
+    if item.is_local:
+        # telegram files are finite, their length is probed when the job starts
+        return True
+    known = track_details(item.ref)
+    if known is None:
+        return False
+    duration, live = known
+    return not live and duration is not None and duration <= TRANSCODE_MAX_DURATION
+
+
+async def _probe_duration(source: str) -> Optional[float]:
+    process = await asyncio.create_subprocess_exec(
+        "ffprobe", "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        source,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        stdout, _ = await asyncio.wait_for(process.communicate(), PROBE_TIMEOUT)
+    except asyncio.TimeoutError:
+        process.kill()
+        return None
+    try:
+        # live and other endless sources report N/A
+        return float(stdout.decode().strip())
+    except ValueError:
+        return None
+
+
+class Transcoder:
+    """Keeps popular tracks ready in the format a call consumes.
+
+    Every play that starts is counted per (track, variant) with
+    ``note_play``; once a variant has been played ``TRANSCODE_MIN_PLAYS``
+    times within a popularity window starting at its first play it is
+    transcoded in the background, ``TRANSCODE_WORKERS`` at a time. Live
+    streams and tracks over ``TRANSCODE_MAX_DURATION`` are never counted.
+    Later plays read the prepared file instead of decoding, scaling and
+    resampling the source again. Before a job starts, files are evicted
+    least recently played first until its worst-case output fits in
+    ``TRANSCODE_CACHE_MB`` next to the running jobs' reservations.
+    """
+
+    def __init__(self, directory: str, quota: int):
+        self.directory = directory
+        self.quota = quota
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._plays = TTLCache(maxsize=8192, ttl=POPULARITY_WINDOW)
+        self._pending: Set[str] = set()
+        # bytes each running job may still write
+        self._reserved: Dict[str, int] = {}
+        self._running: Dict[str, asyncio.subprocess.Process] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def load(self):
+        """Index the files kept from earlier runs."""
+        if self._loaded:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith("tmp.") or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._entries[name] = size
+        self._loaded = True
+
+    @staticmethod
+    def _name(item: QueueItem, variant: str) -> str:
+        digest = hashlib.sha1(item.ref.encode()).hexdigest()[:24]
+        return f"{digest}.{variant}.{'ogg' if variant == 'audio' else 'mkv'}"
+
+    def path_for(self, item: QueueItem) -> Optional[str]:
+        """The prepared file for ``item`` if there is one, without counting a play."""
+        name = self._name(item, _variant(item))
+        return os.path.join(self.directory, name) if name in self._entries else None
+
+    def prefer(self, item: QueueItem) -> Optional[str]:
+        """The prepared file for ``item``, if any, for building its stream."""
+        self.load()
+        name = self._name(item, _variant(item))
+        if name in self._entries:
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path):
+                self._entries.move_to_end(name)
+                os.utime(path)
+                self.hits += 1
+                return path
+            del self._entries[name]
+        self.misses += 1
+        return None
+
+    def note_play(self, item: QueueItem):
+        """Count one play that actually started; restores and retries don't."""
+        variant = _variant(item)
+        name = self._name(item, variant)
+        if name in self._entries or name in self._pending or not _admissible(item):
+            return
+        now = monotonic()
+        first, plays = self._plays.get(name, (now, 0))
+        plays += 1
+        # the window is fixed at the first play, later ones do not extend it
+        self._plays.set(name, (first, plays), ttl=first + POPULARITY_WINDOW - now)
+        if plays >= TRANSCODE_MIN_PLAYS:
+            # a telegram file still downloading is picked up on a later play
+            if not (item.is_local and media_cache.is_growing(item.link)):
+                self._plays.pop(name)
+                self._pending.add(name)
+                asyncio.ensure_future(self._transcode(item, variant, name))
+
+    async def _transcode(self, item: QueueItem, variant: str, name: str):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(TRANSCODE_WORKERS)
+        target = os.path.join(self.directory, name)
+        temp = os.path.join(self.directory, f"tmp.{name}")
+        try:
+            async with self._slots:
+                source = item.link
+                if not item.is_local:
+                    # the url queued with the item may have expired while waiting
+                    ok, source = await ytdl(item.ref)
+                    if not ok:
+                        raise RuntimeError(f"could not resolve {item.ref}: {source}")
+                duration = await _probe_duration(source)
+                if not duration or duration > TRANSCODE_MAX_DURATION:
+                    self.skipped += 1
+                    return
+                limit = int(duration * MAX_BITRATES[variant] / 8)
+                if not self._evict(room=limit):
+                    self.skipped += 1
+                    return
+                self._reserved[name] = limit
+                process = await asyncio.create_subprocess_exec(
+                    *_ffmpeg_args(source, variant, temp, limit),
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+                self._running[name] = process
+                _, stderr = await process.communicate()
+            if process.returncode != 0:
+                raise RuntimeError(stderr.decode().strip()[-200:] or f"exit {process.returncode}")
+            if os.path.getsize(temp) >= limit:
+                raise RuntimeError(f"output reached its {limit} byte limit")
+            os.replace(temp, target)
+            self._entries[name] = os.path.getsize(target)
+            self._reserved.pop(name, None)
+            self.done += 1
+            self._evict()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            print(f"⚠️  Transcode of {name} failed: {e}")
+        finally:
+            self._running.pop(name, None)
+            self._reserved.pop(name, None)
+            self._pending.discard(name)
+            if os.path.exists(temp):
+                os.remove(temp)
+
+    def _evict(self, room: int = 0) -> bool:
+        """Drop least recently played files until ``room`` more bytes fit."""
+        if room > self.quota:
+            return False
+        total = sum(self._entries.values()) + sum(self._reserved.values())
+        # after a job the newest file stays even if it alone is over quota
+        keep = 0 if room else 1
+        while total + room > self.quota and len(self._entries) > keep:
+            # a call still reading an evicted file keeps its open handle
+            name, size = self._entries.popitem(last=False)
+            total -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+        return total + room <= self.quota
+
+    def stop(self):
+        for process in list(self._running.values()):
+            if process.returncode is None:
+                process.kill()
+
+    def stats(self) -> dict:
+        return {
+            "files": len(self._entries),
+            "bytes": sum(self._entries.values()),
+            "quota": self.quota,
+            "hits": self.hits,
+            "misses": self.misses,
+            "running": len(self._running),
+            "queued": len(self._pending) - len(self._running),
+            "done": self.done,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "reserved": sum(self._reserved.values()),
+        }
+
+
+transcoder = Transcoder(TRANSCODE_DIR, TRANSCODE_CACHE_MB * 1024 * 1024)
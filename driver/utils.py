@@ -1,16 +1,30 @@
 import os
 import asyncio
 
-from driver.core import bot, calls, user
-from driver.database.dbqueue import remove_active_chat
+from driver.core import assistants, bot, calls, user
+from driver.database.dbqueue import (
+    add_active_chat,
+    is_music_playing,
+    playback_state,
+    prune_active_chats,
+    remove_active_chat,
+)
 from driver.queues import (
     QUEUE,
+    snapshots,
+    restore_queues,
     clear_queue,
     get_queue,
     pop_an_item,
-    clean_trash,
+    remove_from_queue,
 )
+from driver.mediacache import media_cache
+from driver.transcode import transcoder
+from driver.prefetch import PLAY_MARGIN, is_fresh, prefetch_next, refresh
+from pyrogram.errors import UserAlreadyParticipant, UserNotParticipant
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from pytgcalls import StreamType
+from pytgcalls.exceptions import AlreadyJoinedError
 from pytgcalls.types.input_stream import AudioPiped, AudioVideoPiped
 from pytgcalls.types.input_stream.quality import (
     HighQualityAudio,
@@ -32,11 +46,59 @@ keyboard = InlineKeyboardMarkup(
 )
 
 
+def build_stream(item, seek: int = 0):
+    # popular tracks play from a file already in the call's format
+    prepared = transcoder.prefer(item)
+    link = prepared or item.link
+    # a telegram file may still be downloading when its turn comes
+    extra = media_cache.ffmpeg_parameters(link) if item.is_local and not prepared else ""
+    if seek:
+        extra = f"-ss {seek} {extra}".strip()
+    if item.type == "video":
+        if item.quality == 480:
+            qual = MediumQualityVideo()
+        elif item.quality == 360:
+            qual = LowQualityVideo()
+        else:
+            qual = HighQualityVideo()
+        return AudioVideoPiped(link, HighQualityAudio(), qual, additional_ffmpeg_parameters=extra)
+    return AudioPiped(link, HighQualityAudio(), additional_ffmpeg_parameters=extra)
+
+
+async def join_and_play(chat_id, item, stream_type):
+    """Join the voice chat with ``item`` playing, counting the play."""
+    await calls.join_group_call(chat_id, build_stream(item), stream_type=stream_type)
+    transcoder.note_play(item)
+
+
+async def _restream(chat_id: int, item):
+    try:
+        position = await calls.played_time(chat_id)
+    except Exception:
+        return  # the call ended meanwhile
+    chat_queue = QUEUE.get(chat_id)
+    if not chat_queue or chat_queue[0] is not item:
+        return
+    try:
+        await calls.change_stream(chat_id, build_stream(item, seek=int(position or 0)))
+        if not await is_music_playing(chat_id):
+            await calls.pause_stream(chat_id)
+    except Exception as e:
+        print(f"⚠️  Could not move {chat_id} to the downloaded file: {e}")
+
+
+def restream_completed(path: str):
+    """Move calls playing a file that just finished downloading onto the
+    complete file, from where they are, so their ffmpeg stops at its end
+    instead of waiting out the read timeout of a growing file."""
+    for chat_id, chat_queue in list(QUEUE.items()):
+        if chat_queue and chat_queue[0].is_local and chat_queue[0].link == path:
+            asyncio.ensure_future(_restream(chat_id, chat_queue[0]))
+
+
 async def skip_current_song(chat_id):
     if chat_id in QUEUE:
         chat_queue = get_queue(chat_id)
-        if "t.me" in chat_queue[0][2]:
-            clean_trash(chat_queue[0][1], chat_id)
         if len(chat_queue) == 1:
             await calls.leave_group_call(chat_id)
             await remove_active_chat(chat_id)
@@ -44,36 +106,15 @@ async def skip_current_song(chat_id):
             return 1
         else:
             try:
-                songname = chat_queue[1][0]
-                url = chat_queue[1][1]
-                link = chat_queue[1][2]
-                type = chat_queue[1][3]
-                sets = chat_queue[1][4]
-                if type == "music":
-                    await calls.change_stream(
-                        chat_id,
-                        AudioPiped(
-                            url,
-                            HighQualityAudio(),
-                        ),
-                    )
-                elif type == "video":
-                    if sets == 720:
-                        qual = HighQualityVideo()
-                    elif sets == 480:
-                        qual = MediumQualityVideo()
-                    elif sets == 360:
-                        qual = LowQualityVideo()
-                    await calls.change_stream(
-                        chat_id,
-                        AudioVideoPiped(
-                            url,
-                            HighQualityAudio(),
-                            qual,
-                        ),
-                    )
+                item = chat_queue[1]
+                if not is_fresh(item, margin=PLAY_MARGIN):
+                    # the prefetcher missed this one, resolve on the critical path
+                    await refresh(item)
+                await calls.change_stream(chat_id, build_stream(item))
+                transcoder.note_play(item)
                 pop_an_item(chat_id)
-                return [songname, link, type]
+                prefetch_next(chat_id)
+                return [item.songname, item.ref, item.type]
             except BaseException as error:
                 print(error)
                 await calls.leave_group_call(chat_id)
@@ -86,12 +127,12 @@ async def skip_current_song(chat_id):
 
 async def skip_item(chat_id, h):
     if chat_id in QUEUE:
-        chat_queue = get_queue(chat_id)
         try:
             x = int(h)
-            songname = chat_queue[x][0]
-            chat_queue.pop(x)
-            return songname
+            item = remove_from_queue(chat_id, x)
+            if not item:
+                return 0
+            return item.songname
         except Exception as e:
             print(e)
             return 0
@@ -99,6 +140,86 @@ async def skip_item(chat_id, h):
         return 0
 
 
+async def _invite_link(chat_id: int) -> str:
+    invitelink = (await bot.get_chat(chat_id)).invite_link
+    if not invitelink:
+        await bot.export_chat_invite_link(chat_id)
+        invitelink = (await bot.get_chat(chat_id)).invite_link
+    if invitelink.startswith("https://t.me/+"):
+        invitelink = invitelink.replace("https://t.me/+", "https://t.me/joinchat/")
+    return invitelink
+
+
+async def ensure_member(chat_id: int):
+    """Make the chat's assistant join the group if it is not in it yet.
+
+    A chat moved to another assistant (failover, or a new assignment
+    after a restart) cannot play until that account is a member.
+    """
+    assistant = assistants.assistant_for(chat_id)
+    try:
+        await bot.get_chat_member(chat_id, assistant.me.id)
+    except UserNotParticipant:
+        try:
+            await assistant.client.join_chat(await _invite_link(chat_id))
+        except UserAlreadyParticipant:
+            pass
+
+
+async def resume_chat(chat_id: int) -> bool:
+    """Join the chat's voice chat again and play the head of its queue.
+
+    Used after a restart and when the chat's assistant fails over, so the
+    assistant joins the group first if it has to; on failure the queue is
+    dropped.
+    """
+    chat_queue = get_queue(chat_id)
+    if not chat_queue:
+        return False
+    item = chat_queue[0]
+    if not is_fresh(item, margin=PLAY_MARGIN):
+        await refresh(item)
+    stream_type = StreamType().pulse_stream if item.is_local else StreamType().local_stream
+    try:
+        await ensure_member(chat_id)
+        try:
+            await calls.join_group_call(chat_id, build_stream(item), stream_type=stream_type)
+        except AlreadyJoinedError:
+            await calls.change_stream(chat_id, build_stream(item))
+        await add_active_chat(chat_id)
+        prefetch_next(chat_id)
+        return True
+    except Exception as e:
+        print(f"⚠️  Could not resume queue in {chat_id}: {e}")
+        await remove_active_chat(chat_id)
+        clear_queue(chat_id)
+        return False
+
+
+# a limited or banned assistant hands its chats to another one
+assistants.on_failover = resume_chat
+
+
+async def restore_playback():
+    """Bring back the queues persisted before the last shutdown or crash.
+
+    The head of every restored queue is rejoined; chats whose voice chat
+    is gone are dropped, and the active-chat collection is pruned to the
+    chats that actually resumed.
+    """
+    snapshots.start()
+    playback_state.start()
+    # cached media must be known before restored queues start releasing it
+    media_cache.load()
+    resumed = []
+    for chat_id in await restore_queues():
+        if await resume_chat(chat_id):
+            resumed.append(chat_id)
+    await prune_active_chats(resumed)
+    if resumed:
+        print(f"✅ Resumed playback in {len(resumed)} chats")
+
+
 @calls.on_kicked()
 async def kicked_handler(_, chat_id: int):
     if chat_id in QUEUE:
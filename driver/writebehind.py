@@ -0,0 +1,65 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, Optional, Set
+
+
+class WriteBehind:
+    """Coalesce changes to a set of keys and persist them in batches.
+
+    Callers only ``mark`` a key as dirty; every ``interval`` seconds the
+    flush callback receives all keys marked since the last round and is
+    expected to read their *current* state and write it in one go. A key
+    changed fifty times between two flushes costs one write.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[Set[Hashable]], Awaitable[None]],
+        interval: float = 3.0,
+        name: str = "write-behind",
+    ):
+        self._flush = flush
+        self.interval = interval
+        self.name = name
+        self._dirty: Set[Hashable] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+
+    def mark(self, key: Hashable):
+        self._dirty.add(key)
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        keys, self._dirty = self._dirty, set()
+        try:
+            await self._flush(keys)
+        except Exception as e:
+            # keep the keys so the next round retries them
+            self._dirty |= keys
+            print(f"⚠️  {self.name} flush failed: {e}")
+
+    async def _run(self):
+        while self._running:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._running = True
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the background loop and write whatever is still pending."""
+        self._running = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
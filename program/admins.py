@@ -19,16 +19,17 @@ along with this program. If not, see <https://www.gnu.org/licenses/licenses.html
 
 import traceback
 
-from cache.admins import admins
+from cache.admins import set as set_admins
+from cache.members import get_member, invalidate
 from config import BOT_USERNAME, IMG_5
 
-from driver.core import calls, me_user
+from driver.core import assistants, calls
 from driver.design.thumbnail import thumb
 from driver.design.chatname import CHAT_TITLE
 from driver.queues import QUEUE, clear_queue
 from driver.filters import command, other_filters
 from driver.decorators import authorized_users_only, check_blacklist
-from driver.utils import skip_current_song, skip_item, remove_if_exists
+from driver.utils import skip_current_song, skip_item
 from driver.database.dbqueue import (
     is_music_playing,
     remove_active_chat,
@@ -40,6 +41,7 @@ from pyrogram import Client, filters
 from program.utils.inline import stream_markup, close_mark
 from pyrogram.types import (
     CallbackQuery,
+    ChatMemberUpdated,
     InlineKeyboardMarkup,
     Message,
 )
@@ -49,17 +51,23 @@ from pyrogram.types import (
 @authorized_users_only
 @check_blacklist()
 async def update_admin(client, message: Message):
-    global admins
+    invalidate(message.chat.id)
     new_admins = []
     new_ads = await client.get_chat_members(message.chat.id, filter="administrators")
     for u in new_ads:
         new_admins.append(u.user.id)
-    admins[message.chat.id] = new_admins
+    set_admins(message.chat.id, new_admins)
     await message.reply_text(
         "✅ تم اعادة **تشغيل البوت** !\n✅ وتم **تحديث** قائمة **المشرفين.**"
     )
 
 
+@Client.on_chat_member_updated()
+async def member_updated(_, update: ChatMemberUpdated):
+    member = update.new_chat_member or update.old_chat_member
+    invalidate(update.chat.id, member.user.id if member else None)
+
+
 @Client.on_message(
     command(["كافي", f"اوكف", "ك", f"ايقاف", "انهاء"])
     & other_filters
@@ -147,7 +155,7 @@ async def skip(c: Client, m: Message):
         title = f"{queue[0]}"
         userid = m.from_user.id
         gcname = m.chat.title
-        ctitle = await CHAT_TITLE(gcname)
+        ctitle = await CHAT_TITLE(gcname, m.chat.id)
         image = await thumb(thumbnail, title, userid, ctitle)
         await c.send_photo(
             chat_id,
@@ -155,7 +163,6 @@ async def skip(c: Client, m: Message):
             reply_markup=InlineKeyboardMarkup(buttons),
             caption=f"⏭ **اެبشࢪ يحݪۅ** تم اެݪتخطي اެݪى اݪمساࢪ اެݪتالي.\n\n❤️‍🔥 **اެݪاެسم:** [{queue[0]}]({queue[1]})\n❤️‍🔥 **اެݪدࢪدشةه:** `{chat_id}`\n🦴 **طݪب اެݪحݪۅ:** {requester}",
         )
-        remove_if_exists(image)
 
 
 @Client.on_message(
@@ -212,7 +219,7 @@ async def unmute(client, m: Message):
 async def change_volume(c: Client, m: Message):
     if len(m.command) < 2:
         return await m.reply_text("الاستخدام: `.اضبط` (`0-200`)")
-    a = await c.get_chat_member(m.chat.id, me_user.id)
+    a = await get_member(c, m.chat.id, assistants.assistant_for(m.chat.id).me.id)
     if not a.can_manage_voice_chats:
         return await m.reply_text(
             " 👍🏻لاستخدام هذه الامر ، عليك رفع حساب المساعد : بصلاحية الدردشة الصوتية"
@@ -235,7 +242,7 @@ async def change_volume(c: Client, m: Message):
 @Client.on_callback_query(filters.regex("set_pause"))
 @check_blacklist()
 async def cbpause(_, query: CallbackQuery):
-    a = await _.get_chat_member(query.message.chat.id, query.from_user.id)
+    a = await get_member(_, query.message.chat.id, query.from_user.id)
     if not a.can_manage_voice_chats:
         return await query.answer("💡 وخر ايدك لاتبعبص محد يكدر يدوس هنا بس الي عنده صلاحية المكالمات !", show_alert=True)
     chat_id = query.message.chat.id
@@ -257,7 +264,7 @@ async def cbpause(_, query: CallbackQuery):
 @Client.on_callback_query(filters.regex("set_resume"))
 @check_blacklist()
 async def cbresume(_, query: CallbackQuery):
-    a = await _.get_chat_member(query.message.chat.id, query.from_user.id)
+    a = await get_member(_, query.message.chat.id, query.from_user.id)
     if not a.can_manage_voice_chats:
         return await query.answer("💡 وخر ايدك لاتبعبص محد يكدر يدوس هنا بس الي عنده صلاحية المكالمات !", show_alert=True)
     chat_id = query.message.chat.id
@@ -279,7 +286,7 @@ async def cbresume(_, query: CallbackQuery):
 @Client.on_callback_query(filters.regex("set_stop"))
 @check_blacklist()
 async def cbstop(_, query: CallbackQuery):
-    a = await _.get_chat_member(query.message.chat.id, query.from_user.id)
+    a = await get_member(_, query.message.chat.id, query.from_user.id)
     if not a.can_manage_voice_chats:
         return await query.answer("💡 وخر ايدك لاتبعبص محد يكدر يدوس هنا بس الي عنده صلاحية المكالمات !", show_alert=True)
     chat_id = query.message.chat.id
@@ -299,7 +306,7 @@ async def cbstop(_, query: CallbackQuery):
 @Client.on_callback_query(filters.regex("set_mute"))
 @check_blacklist()
 async def cbmute(_, query: CallbackQuery):
-    a = await _.get_chat_member(query.message.chat.id, query.from_user.id)
+    a = await get_member(_, query.message.chat.id, query.from_user.id)
     if not a.can_manage_voice_chats:
         return await query.answer("💡 وخر ايدك لاتبعبص محد يكدر يدوس هنا بس الي عنده صلاحية المكالمات !", show_alert=True)
     chat_id = query.message.chat.id
@@ -321,7 +328,7 @@ async def cbmute(_, query: CallbackQuery):
 @Client.on_callback_query(filters.regex("set_unmute"))
 @check_blacklist()
 async def cbunmute(_, query: CallbackQuery):
-    a = await _.get_chat_member(query.message.chat.id, query.from_user.id)
+    a = await get_member(_, query.message.chat.id, query.from_user.id)
     if not a.can_manage_voice_chats:
         return await query.answer("💡 وخر ايدك لاتبعبص محد يكدر يدوس هنا بس الي عنده صلاحية المكالمات !", show_alert=True)
     chat_id = query.message.chat.id
@@ -343,7 +350,7 @@ async def cbunmute(_, query: CallbackQuery):
 @Client.on_callback_query(filters.regex("set_skip"))
 @check_blacklist()
 async def cbskip(_, query: CallbackQuery):
-    a = await _.get_chat_member(query.message.chat.id, query.from_user.id)
+    a = await get_member(_, query.message.chat.id, query.from_user.id)
     if not a.can_manage_voice_chats:
         return await query.answer("💡 وخر ايدك لاتبعبص محد يكدر يدوس هنا بس الي عنده صلاحية المكالمات !", show_alert=True)
     chat_id = query.message.chat.id
@@ -364,7 +371,7 @@ async def cbskip(_, query: CallbackQuery):
         title = f"{queue[0]}"
         userid = query.from_user.id
         gcname = query.message.chat.title
-        ctitle = await CHAT_TITLE(gcname)
+        ctitle = await CHAT_TITLE(gcname, query.message.chat.id)
         image = await thumb(thumbnail, title, userid, ctitle)
         await _.send_photo(
             chat_id,
@@ -372,4 +379,3 @@ async def cbskip(_, query: CallbackQuery):
             reply_markup=InlineKeyboardMarkup(buttons),
             caption=f"⏭ **اެبشࢪ يحݪۅ** تم اެݪتخطي اެݪى اݪمساࢪ اެݪتالي.\n\n❤️‍🔥 **Name:** [{queue[0]}]({queue[1]})\n❤️‍🔥 **Chat:** `{chat_id}`\n🦴 **طݪب اެݪحݪۅ:** {requester}",
         )
-        remove_if_exists(image)
@@ -27,6 +27,7 @@ from driver.decorators import sudo_users_only
 from driver.database.dblockchat import (
   blacklist_chat,
   blacklisted_chats,
+  is_blacklisted_chat,
   whitelist_chat,
 )
 
@@ -39,7 +40,7 @@ async def blacklist_chat_func(_, message: Message):
             "**usage:**\n\n» /block (`chat_id`)"
         )
     chat_id = int(message.text.strip().split()[1])
-    if chat_id in await blacklisted_chats():
+    if is_blacklisted_chat(chat_id):
         return await message.reply_text("This chat already blacklisted.")
     blacklisted = await blacklist_chat(chat_id)
     if blacklisted:
@@ -57,7 +58,7 @@ async def whitelist_chat_func(_, message: Message):
             "**usage:**\n\n» /unblock (`chat_id`)"
         )
     chat_id = int(message.text.strip().split()[1])
-    if chat_id not in await blacklisted_chats():
+    if not is_blacklisted_chat(chat_id):
         return await message.reply_text("This chat already whitelisted.")
     whitelisted = await whitelist_chat(chat_id)
     if whitelisted:
@@ -17,6 +17,7 @@ along with this program. If not, see <https://www.gnu.org/licenses/licenses.html
 """
 
 
+from cache.members import get_member
 from driver.core import me_bot, me_user
 from driver.queues import QUEUE
 from driver.decorators import check_blacklist
@@ -137,7 +138,7 @@ async def user_set(_, query: CallbackQuery):
 @check_blacklist()
 async def at_set_markup_menu(_, query: CallbackQuery):
     user_id = query.from_user.id
-    a = await _.get_chat_member(query.message.chat.id, query.from_user.id)
+    a = await get_member(_, query.message.chat.id, query.from_user.id)
     if not a.can_manage_voice_chats:
         return await query.answer("💡 وخر ايدك لاتبعبص محد يكدر يدوس هنا بس الي عنده صلاحية المكالمات !", show_alert=True)
     chat_id = query.message.chat.id
@@ -153,7 +154,7 @@ async def at_set_markup_menu(_, query: CallbackQuery):
 @Client.on_callback_query(filters.regex("stream_home_panel"))
 @check_blacklist()
 async def is_set_home_menu(_, query: CallbackQuery):
-    a = await _.get_chat_member(query.message.chat.id, query.from_user.id)
+    a = await get_member(_, query.message.chat.id, query.from_user.id)
     if not a.can_manage_voice_chats:
         return await query.answer("💡 وخر ايدك لاتبعبص محد يكدر يدوس هنا بس الي عنده صلاحية المكالمات !", show_alert=True)
     await query.answer("control panel closed")
@@ -165,7 +166,7 @@ async def is_set_home_menu(_, query: CallbackQuery):
 @Client.on_callback_query(filters.regex("set_close"))
 @check_blacklist()
 async def on_close_menu(_, query: CallbackQuery):
-    a = await _.get_chat_member(query.message.chat.id, query.from_user.id)
+    a = await get_member(_, query.message.chat.id, query.from_user.id)
     if not a.can_manage_voice_chats:
         return await query.answer("💡 وخر ايدك لاتبعبص محد يكدر يدوس هنا بس الي عنده صلاحية المكالمات !", show_alert=True)
     await query.message.delete()
@@ -17,12 +17,12 @@ import yt_dlp
 from pyrogram import Client, filters
 from pyrogram.errors import FloodWait, MessageNotModified
 from pyrogram.types import Message
-from youtube_search import YoutubeSearch
 from yt_dlp import YoutubeDL
 
 from config import BOT_USERNAME as bn
 from driver.decorators import humanbytes
 from driver.filters import command, other_filters
+from driver.search import search
 
 
 ydl_opts = {
@@ -41,10 +41,13 @@ def song(_, message):
     m = message.reply("❤️‍🔥 جَاެࢪي اެݪبَحثَ...")
     ydl_ops = {"format": "bestaudio[ext=m4a]"}
     try:
-        results = YoutubeSearch(query, max_results=1).to_dict()
-        link = f"https://youtube.com{results[0]['url_suffix']}"
+        # this handler runs in a worker thread, hand the search to the bot's loop
+        results = asyncio.run_coroutine_threadsafe(
+            search(query, limit=1), _.loop
+        ).result()
+        link = results[0]["link"]
         title = results[0]["title"][:40]
-        thumbnail = results[0]["thumbnails"][0]
+        thumbnail = results[0]["thumbnails"][0]["url"]
         thumb_name = f"{title}.jpg"
         thumb = requests.get(thumbnail, allow_redirects=True)
         open(thumb_name, "wb").write(thumb.content)
@@ -100,16 +103,16 @@ async def vsong(client, message):
     }
     query = " ".join(message.command[1:])
     try:
-        results = YoutubeSearch(query, max_results=1).to_dict()
-        link = f"https://youtube.com{results[0]['url_suffix']}"
+        results = await search(query, limit=1)
+        link = results[0]["link"]
         title = results[0]["title"][:40]
-        thumbnail = results[0]["thumbnails"][0]
+        thumbnail = results[0]["thumbnails"][0]["url"]
         thumb_name = f"{title}.jpg"
         thumb = requests.get(thumbnail, allow_redirects=True)
         open(thumb_name, "wb").write(thumb.content)
         results[0]["duration"]
-        results[0]["url_suffix"]
-        results[0]["views"]
+        results[0]["link"]
+        results[0]["viewCount"]
         message.from_user.mention
     except Exception as e:
         print(e)
@@ -17,7 +17,6 @@ along with this program. If not, see <https://www.gnu.org/licenses/licenses.html
 """
 
 
-import asyncio
 import traceback
 
 from pyrogram.types import Message
@@ -30,114 +29,67 @@ from program.start import __python_version__ as pyver
 from driver.core import me_bot
 from driver.filters import command
 from driver.decorators import bot_creator, sudo_users_only
-from driver.database.dbchat import get_served_chats
-from driver.database.dbusers import get_served_users
+from driver.database.dbchat import get_served_chats, get_served_chats_count
+from driver.database.dbusers import get_served_users_count
 from driver.database.dbpunish import get_gbans_count
 from driver.database.dbqueue import get_active_chats
+from driver.jobs import flood_wait_seconds, job_handler, limiter, start_job
 
 from config import BOT_USERNAME as uname
 
 
-@Client.on_message(command(["broadcast", f"broadcast@{uname}"]) & ~filters.edited)
-@bot_creator
-async def broadcast_message_nopin(c: Client, message: Message):
-    if not message.reply_to_message:
-        pass
+@job_handler("broadcast", title="Broadcast")
+@job_handler("broadcast_pin", cost=2, title="Broadcast + pin")
+async def deliver_broadcast(c: Client, chat_id: int, payload: dict) -> str:
+    if payload.get("message_id"):
+        m = await c.forward_messages(chat_id, payload["from_chat"], payload["message_id"])
     else:
-        x = message.reply_to_message.message_id
-        y = message.chat.id
-        sent = 0
-        chats = []
-        schats = await get_served_chats()
-        for chat in schats:
-            chats.append(int(chat["chat_id"]))
-        for i in chats:
-            try:
-                m = await c.forward_messages(i, y, x)
-                await asyncio.sleep(0.3)
-                sent += 1
-            except Exception:
-                pass
-        await message.reply_text(f"✅ Broadcast complete in {sent} Group.")
-        return
-    if len(message.command) < 2:
+        m = await c.send_message(chat_id, text=payload["text"])
+    if not payload.get("pin"):
+        return "sent"
+    try:
+        await m.pin(disable_notification=True)
+        return "pinned"
+    except Exception as e:
+        # the message is out already; never resend it just to retry the pin
+        wait = flood_wait_seconds(e)
+        if wait is not None:
+            limiter.on_flood(wait)
+        return "sent"
+
+
+async def start_broadcast(c: Client, message: Message, pin: bool):
+    if message.reply_to_message:
+        payload = {
+            "from_chat": message.chat.id,
+            "message_id": message.reply_to_message.message_id,
+        }
+    elif len(message.command) < 2:
         await message.reply_text(
-            "**usage**:\n\n/broadcast (`message`) or (`reply to message`)"
+            f"**usage**:\n\n/{message.command[0]} (`message`) or (`reply to message`)"
         )
         return
-    text = message.text.split(None, 1)[1]
-    sent = 0
-    chats = []
-    schats = await get_served_chats()
-    for chat in schats:
-        chats.append(int(chat["chat_id"]))
-    for i in chats:
-        try:
-            m = await c.send_message(i, text=text)
-            await asyncio.sleep(0.3)
-            sent += 1
-        except Exception:
-            pass
-    await message.reply_text(f"✅ Broadcast complete in {sent} Group.")
+    else:
+        payload = {"text": message.text.split(None, 1)[1]}
+    payload["pin"] = pin
+    targets = sorted(int(chat["chat_id"]) for chat in await get_served_chats())
+    status = await message.reply_text("📣 Starting broadcast...")
+    job = await start_job(c, "broadcast_pin" if pin else "broadcast", targets, payload, status)
+    await status.edit_text(
+        f"{job.progress_text()}\n\n`/job {job.id}` for progress, `/canceljob {job.id}` to stop."
+    )
+
+
+@Client.on_message(command(["broadcast", f"broadcast@{uname}"]) & ~filters.edited)
+@bot_creator
+async def broadcast_message_nopin(c: Client, message: Message):
+    await start_broadcast(c, message, pin=False)
 
 
 @Client.on_message(command(["broadcast_pin", f"broadcast_pin@{uname}"]) & ~filters.edited)
 @bot_creator
 async def broadcast_message_pin(c: Client, message: Message):
-    if not message.reply_to_message:
-        pass
-    else:
-        x = message.reply_to_message.message_id
-        y = message.chat.id
-        sent = 0
-        pin = 0
-        chats = []
-        schats = await get_served_chats()
-        for chat in schats:
-            chats.append(int(chat["chat_id"]))
-        for i in chats:
-            try:
-                m = await c.forward_messages(i, y, x)
-                try:
-                    await m.pin(disable_notification=True)
-                    pin += 1
-                except Exception:
-                    pass
-                await asyncio.sleep(0.3)
-                sent += 1
-            except Exception:
-                pass
-        await message.reply_text(
-            f"✅ Broadcast complete in {sent} Group.\n📌 Sent with {pin} chat pins."
-        )
-        return
-    if len(message.command) < 2:
-        await message.reply_text(
-            "**usage**:\n\n/broadcast_pin (`message`) or (`reply to message`)"
-        )
-        return
-    text = message.text.split(None, 1)[1]
-    sent = 0
-    pin = 0
-    chats = []
-    schats = await get_served_chats()
-    for chat in schats:
-        chats.append(int(chat["chat_id"]))
-    for i in chats:
-        try:
-            m = await c.send_message(i, text=text)
-            try:
-                await m.pin(disable_notification=True)
-                pin += 1
-            except Exception:
-                pass
-            await asyncio.sleep(0.3)
-            sent += 1
-        except Exception:
-            pass
-    await message.reply_text(
-        f"✅ Broadcast complete in {sent} Group.\n📌 Sent with {pin} chat pins."
-    )
+    await start_broadcast(c, message, pin=True)
 
 
 @Client.on_message(command(["الاحصائيات", f"stats@{uname}"]) & ~filters.edited)
@@ -148,8 +100,8 @@ async def bot_statistic(c: Client, message: Message):
     msg = await c.send_message(
         chat_id, "❖ جاري جمع الاحصائيات..."
     )
-    served_chats = len(await get_served_chats())
-    served_users = len(await get_served_users())
+    served_chats = await get_served_chats_count()
+    served_users = await get_served_users_count()
     gbans_usertl = await get_gbans_count()
     tgm = f"""
 📊 الاحصائيات الحالية لـ -›  [{name}](https://t.me/{uname})`:`
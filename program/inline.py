@@ -17,13 +17,29 @@ along with this program. If not, see <https://www.gnu.org/licenses/licenses.html
 """
 
 
+import asyncio
+from typing import Dict
+
 from pyrogram import Client, errors
 from pyrogram.types import (
     InlineQuery,
     InlineQueryResultArticle,
     InputTextMessageContent,
 )
-from youtubesearchpython import VideosSearch
+
+from driver.search import search
+
+
+PAGE_SIZE = 10
+# results fetched beyond the requested page, so scrolling mostly hits the cache
+LOOKAHEAD = 10
+MAX_RESULTS = 50
+# typing pauses shorter than this are not worth a search
+DEBOUNCE = 0.5
+CACHE_TIME = 300
+
+# user id -> id of that user's newest inline query
+_latest: Dict[int, str] = {}
 
 
 @Client.on_inline_query()
@@ -37,12 +53,25 @@ async def inline(client: Client, query: InlineQuery):
             results=answers,
             switch_pm_text="Type the YouTube video name to search !",
             switch_pm_parameter="help",
-            cache_time=0,
+            cache_time=CACHE_TIME,
         )
     else:
-        search = VideosSearch(search_query, limit=50)
+        offset = int(query.offset) if query.offset.isdigit() else 0
+        if offset == 0:
+            user_id = query.from_user.id
+            _latest[user_id] = query.id
+            await asyncio.sleep(DEBOUNCE)
+            if _latest.get(user_id) != query.id:
+                # the user kept typing, a newer query supersedes this one
+                return
+            del _latest[user_id]
+
+        limit = min(offset + PAGE_SIZE + LOOKAHEAD, MAX_RESULTS)
+        results = await search(search_query, limit=limit)
+        page = results[offset:offset + PAGE_SIZE]
+        more = offset + PAGE_SIZE < min(len(results), MAX_RESULTS)
 
-        for result in search.result()["result"]:
+        for result in page:
             answers.append(
                 InlineQueryResultArticle(
                     title=result["title"],
@@ -57,11 +86,11 @@ async def inline(client: Client, query: InlineQuery):
             )
 
         try:
-            await query.answer(results=answers, cache_time=0)
-        except errors.QueryIdInvalid:
             await query.answer(
                 results=answers,
-                cache_time=0,
-                switch_pm_text="error: search timed out",
-                switch_pm_parameter="",
+                cache_time=CACHE_TIME,
+                next_offset=str(offset + PAGE_SIZE) if more else "",
             )
+        except errors.QueryIdInvalid:
+            # telegram's deadline passed, there is no one left to answer
+            pass
@@ -0,0 +1,60 @@
+"""
+Video + Music Stream Telegram Bot
+Copyright (c) 2022-present levina=lab <https://github.com/levina-lab>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but without any warranty; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/licenses.html>
+"""
+
+
+from pyrogram import Client, filters
+from pyrogram.types import Message
+
+from config import BOT_USERNAME as uname
+from driver.decorators import bot_creator, sudo_users_only
+from driver.filters import command
+from driver.jobs import cancel_job, get_job, limiter, running_jobs
+
+
+@Client.on_message(command(["jobs", f"jobs@{uname}"]) & ~filters.edited)
+@sudo_users_only
+async def list_jobs(c: Client, message: Message):
+    jobs = running_jobs()
+    if not jobs:
+        return await message.reply_text("❌ no running jobs.")
+    text = f"⚙️ **Running jobs** (limit `{limiter.rate:.1f}` calls/s)\n\n"
+    for job in jobs:
+        text += f"`{job.id}` {job.title}: `{job.done}/{len(job.targets)}`, `{job.throughput():.1f}`/s\n"
+    await message.reply_text(text)
+
+
+@Client.on_message(command(["job", f"job@{uname}"]) & ~filters.edited)
+@sudo_users_only
+async def job_status(c: Client, message: Message):
+    if len(message.command) != 2:
+        return await message.reply_text("**usage:**\n\n» /job (`job_id`)")
+    job = get_job(message.command[1])
+    if not job:
+        return await message.reply_text("❌ no running job with that id.")
+    await message.reply_text(job.progress_text())
+
+
+@Client.on_message(command(["canceljob", f"canceljob@{uname}"]) & ~filters.edited)
+@bot_creator
+async def job_cancel(c: Client, message: Message):
+    if len(message.command) != 2:
+        return await message.reply_text("**usage:**\n\n» /canceljob (`job_id`)")
+    job = get_job(message.command[1])
+    if not job or not await cancel_job(job.id):
+        return await message.reply_text("❌ no running job with that id.")
+    await message.reply_text(job.progress_text())
@@ -25,8 +25,6 @@ from pyrogram.errors import UserAlreadyParticipant, UserNotParticipant
 from pyrogram.types import InlineKeyboardMarkup, Message
 
 from pytgcalls import StreamType
-from pytgcalls.types.input_stream import AudioPiped
-from pytgcalls.types.input_stream.quality import HighQualityAudio
 from pytgcalls.exceptions import NoAudioSourceFound, NoActiveGroupCall, GroupCallNotFound
 
 from program import LOGS
@@ -34,38 +32,21 @@ from program.utils.inline import stream_markup
 from driver.design.thumbnail import thumb
 from driver.design.chatname import CHAT_TITLE
 from driver.filters import command, other_filters
-from driver.queues import QUEUE, add_to_queue
-from driver.core import calls, user, me_user
-from driver.utils import bash, remove_if_exists, from_tg_get_msg
+from driver.mediacache import media_cache
+from driver.queues import QUEUE, QueueItem, add_to_queue
+from driver.prefetch import prefetch_next
+from driver.resolver import ytdl
+from driver.search import ytsearch
+from driver.supervisor import StreamLimitReached
+from driver.core import assistants, user
+from driver.utils import from_tg_get_msg, join_and_play
 from driver.database.dbqueue import add_active_chat, remove_active_chat, music_on
 from driver.decorators import require_admin, check_blacklist
 
 from config import BOT_USERNAME, IMG_1, IMG_2, IMG_5
 from asyncio.exceptions import TimeoutError
-from youtubesearchpython import VideosSearch
 
 
-def ytsearch(query: str):
-    try:
-        search = VideosSearch(query, limit=1).result()
-        data = search["result"][0]
-        songname = data["title"]
-        url = data["link"]
-        duration = data["duration"]
-        thumbnail = data["thumbnails"][0]["url"]
-        return [songname, url, duration, thumbnail]
-    except Exception as e:
-        print(e)
-        return 0
-
-async def ytdl(link: str):
-    stdout, stderr = await bash(
-        f'yt-dlp --geo-bypass -g -f "[height<=?720][width<=?1280]" {link}'
-    )
-    if stdout:
-        return 1, stdout
-    return 0, stderr
-
 def convert_seconds(seconds):
     seconds = seconds % (24 * 3600)
     seconds %= 3600
@@ -92,7 +73,7 @@ async def play_tg_file(c: Client, m: Message, replied: Message = None, link: str
             suhu = await replied.reply("❤️‍🔥 تَحَمَيَݪ اެݪمَݪفَ...")
         else:
             suhu = await m.reply("❤️‍🔥 ࢪفَع اݪمَݪف...")
-        dl = await replied.download()
+        dl = await media_cache.fetch(replied, progressive=True)
         link = replied.link
         songname = "music"
         thumbnail = f"{IMG_5}"
@@ -121,7 +102,7 @@ async def play_tg_file(c: Client, m: Message, replied: Message = None, link: str
         if chat_id in QUEUE:
             await suhu.edit("❤️‍🔥 تَتم اެݪاضافَة...")
             gcname = m.chat.title
-            ctitle = await CHAT_TITLE(gcname)
+            ctitle = await CHAT_TITLE(gcname, m.chat.id)
             title = songname
             userid = m.from_user.id
             image = await thumb(thumbnail, title, userid, ctitle)
@@ -137,23 +118,19 @@ async def play_tg_file(c: Client, m: Message, replied: Message = None, link: str
                         f"-› **اެݪمدةه:** `{duration}`\n"
                         f"-› **طݪب اެݪحݪۅ:** {requester}",
             )
-            remove_if_exists(image)
         else:
             try:
                 gcname = m.chat.title
-                ctitle = await CHAT_TITLE(gcname)
+                ctitle = await CHAT_TITLE(gcname, m.chat.id)
                 title = songname
                 userid = m.from_user.id
                 image = await thumb(thumbnail, title, userid, ctitle)
                 await suhu.edit("❤️‍🔥 يَتمَ اެݪتشغِيݪ اެلانِ...")
                 await music_on(chat_id)
                 await add_active_chat(chat_id)
-                await calls.join_group_call(
+                await join_and_play(
                     chat_id,
-                    AudioPiped(
-                        dl,
-                        HighQualityAudio(),
-                    ),
+                    QueueItem(songname, dl, link, "music", 0),
                     stream_type=StreamType().pulse_stream,
                 )
                 add_to_queue(chat_id, songname, dl, link, "music", 0)
@@ -169,11 +146,14 @@ async def play_tg_file(c: Client, m: Message, replied: Message = None, link: str
                             f"-› **اެݪمدةه:** `{duration}`\n"
                             f"-› **طݪب اެݪحݪۅ:** {requester}",
                 )
-                remove_if_exists(image)
             except (NoActiveGroupCall, GroupCallNotFound):
                 await suhu.delete()
                 await remove_active_chat(chat_id)
                 await m.reply_text("🦴 شلون اشغل اغنية وماكو مكالمة بلكروب.\n\n-› اكتب .اصعد وحاول مره اخرى !")
+            except StreamLimitReached:
+                await suhu.delete()
+                await remove_active_chat(chat_id)
+                await m.reply_text("🦴 البوت مشغول بمكالمات كثيرة هسه، حاول بعد شوية")
             except Exception as e:
                 LOGS.info(e)
     else:
@@ -195,7 +175,8 @@ async def audio_stream(c: Client, m: Message):
             "you're an __Anonymous__ user !\n\n» revert back to your real user account to use this bot."
         )
     try:
-        ubot = me_user.id
+        assistant = assistants.assistant_for(chat_id)
+        ubot = assistant.me.id
         b = await c.get_chat_member(chat_id, ubot)
         if b.status == "banned":
             try:
@@ -211,7 +192,7 @@ async def audio_stream(c: Client, m: Message):
                 invitelink = invitelink.replace(
                     "https://t.me/+", "https://t.me/joinchat/"
                 )
-            await user.join_chat(invitelink)
+            await assistant.client.join_chat(invitelink)
             await remove_active_chat(chat_id)
     except UserNotParticipant:
         try:
@@ -223,7 +204,7 @@ async def audio_stream(c: Client, m: Message):
                 invitelink = invitelink.replace(
                     "https://t.me/+", "https://t.me/joinchat/"
                 )
-            await user.join_chat(invitelink)
+            await assistant.client.join_chat(invitelink)
             await remove_active_chat(chat_id)
         except UserAlreadyParticipant:
             pass
@@ -243,7 +224,7 @@ async def audio_stream(c: Client, m: Message):
             else:
                 suhu = await c.send_message(chat_id, "❤️‍🔥 جَاެࢪي اެݪبَحثَ...")
                 query = m.text.split(None, 1)[1]
-                search = ytsearch(query)
+                search = await ytsearch(query)
                 if search == 0:
                     await suhu.edit("لم يتم العثور على نتائج جرب اعطاء اسم الاغنية الكامل 🦴")
                 else:
@@ -254,7 +235,7 @@ async def audio_stream(c: Client, m: Message):
                     thumbnail = search[3]
                     userid = m.from_user.id
                     gcname = m.chat.title
-                    ctitle = await CHAT_TITLE(gcname)
+                    ctitle = await CHAT_TITLE(gcname, m.chat.id)
                     image = await thumb(thumbnail, title, userid, ctitle)
                     out, ytlink = await ytdl(url)
                     if out == 0:
@@ -265,6 +246,8 @@ async def audio_stream(c: Client, m: Message):
                             pos = add_to_queue(
                                 chat_id, songname, ytlink, url, "music", 0
                             )
+                            if pos == 1:
+                                prefetch_next(chat_id)
                             await suhu.delete()
                             buttons = stream_markup(user_id)
                             requester = f"[{m.from_user.first_name}](tg://user?id={m.from_user.id})"
@@ -273,18 +256,14 @@ async def audio_stream(c: Client, m: Message):
                                 reply_markup=InlineKeyboardMarkup(buttons),
                                 caption=f"-› **اެبشࢪ عيني ضفتها ݪݪانتضاࢪ -› ** `{pos}`\n\n-› **اެݪاسم:** [{songname}]({url}) | `الاغنية`\n**-› اެݪمدةه:** `{duration}`\n-› **طݪب اެݪحݪۅ:** {requester}",
                             )
-                            remove_if_exists(image)
                         else:
                             try:
                                 await suhu.edit("❤️‍🔥 يَتمَ اެݪتشغِيݪ اެلانِ...")
                                 await music_on(chat_id)
                                 await add_active_chat(chat_id)
-                                await calls.join_group_call(
+                                await join_and_play(
                                     chat_id,
-                                    AudioPiped(
-                                        ytlink,
-                                        HighQualityAudio(),
-                                    ),
+                                    QueueItem(songname, ytlink, url, "music", 0),
                                     stream_type=StreamType().local_stream,
                                 )
                                 add_to_queue(chat_id, songname, ytlink, url, "music", 0)
@@ -298,11 +277,14 @@ async def audio_stream(c: Client, m: Message):
                                     reply_markup=InlineKeyboardMarkup(buttons),
                                     caption=f"-› **اެݪاسم:** [{songname}]({url}) | `الاغنية`\n**-› اެݪمدةه:** `{duration}`\n-› **طݪب اެݪحݪۅ:** {requester}",
                                 )
-                                remove_if_exists(image)
                             except (NoActiveGroupCall, GroupCallNotFound):
                                 await suhu.delete()
                                 await remove_active_chat(chat_id)
                                 await m.reply_text("🦴 شلون اشغل وماكو مكالمة جماعية بلكروب.\n\n-› اكتب .اصعد وحاول مره اخرى")
+                            except StreamLimitReached:
+                                await suhu.delete()
+                                await remove_active_chat(chat_id)
+                                await m.reply_text("🦴 البوت مشغول بمكالمات كثيرة هسه، حاول بعد شوية")
                             except NoAudioSourceFound:
                                 await suhu.delete()
                                 await remove_active_chat(chat_id)
@@ -320,7 +302,7 @@ async def audio_stream(c: Client, m: Message):
         else:
             suhu = await c.send_message(chat_id, "❤️‍🔥 جَاެࢪي اެݪبَحثَ...")
             query = m.text.split(None, 1)[1]
-            search = ytsearch(query)
+            search = await ytsearch(query)
             if search == 0:
                 await suhu.edit("لم يتم العثور على نتائج جرب اعطاء اسم الاغنية الكامل 🦴")
             else:
@@ -331,7 +313,7 @@ async def audio_stream(c: Client, m: Message):
                 thumbnail = search[3]
                 userid = m.from_user.id
                 gcname = m.chat.title
-                ctitle = await CHAT_TITLE(gcname)
+                ctitle = await CHAT_TITLE(gcname, m.chat.id)
                 image = await thumb(thumbnail, title, userid, ctitle)
                 veez, ytlink = await ytdl(url)
                 if veez == 0:
@@ -340,6 +322,8 @@ async def audio_stream(c: Client, m: Message):
                     if chat_id in QUEUE:
                         await suhu.edit("❤️‍🔥 تَتم اެݪاضافَة...")
                         pos = add_to_queue(chat_id, songname, ytlink, url, "music", 0)
+                        if pos == 1:
+                            prefetch_next(chat_id)
                         await suhu.delete()
                         requester = f"[{m.from_user.first_name}](tg://user?id={m.from_user.id})"
                         buttons = stream_markup(user_id)
@@ -348,18 +332,14 @@ async def audio_stream(c: Client, m: Message):
                             reply_markup=InlineKeyboardMarkup(buttons),
                             caption=f"-› **اެبشࢪ عيني ضفتها ݪݪانتضاࢪ -› ** `{pos}`\n\n-› **اެݪاسم:** [{songname}]({url}) | `الاغنية`\n**-› اެݪمدةه:** `{duration}`\n-› **طݪب اެݪحݪۅ:** {requester}",
                         )
-                        remove_if_exists(image)
                     else:
                         try:
                             await suhu.edit("❤️‍🔥 يَتمَ اެݪتشغِيݪ اެلانِ...")
                             await music_on(chat_id)
                             await add_active_chat(chat_id)
-                            await calls.join_group_call(
+                            await join_and_play(
                                 chat_id,
-                                AudioPiped(
-                                    ytlink,
-                                    HighQualityAudio(),
-                                ),
+                                QueueItem(songname, ytlink, url, "music", 0),
                                 stream_type=StreamType().local_stream,
                             )
                             add_to_queue(chat_id, songname, ytlink, url, "music", 0)
@@ -371,11 +351,14 @@ async def audio_stream(c: Client, m: Message):
                                 reply_markup=InlineKeyboardMarkup(buttons),
                                 caption=f"-› **اެݪاسم:** [{songname}]({url}) | `الاغنية`\n**-› اެݪمدةه:** `{duration}`\n-› **طݪب اެݪحݪۅ:** {requester}",
                             )
-                            remove_if_exists(image)
                         except (NoActiveGroupCall, GroupCallNotFound):
                             await suhu.delete()
                             await remove_active_chat(chat_id)
                             await m.reply_text("🦴 شلون اشغل وماكو مكالمة جماعية بلكروب.\n\n-› اكتب .اصعد وحاول مره أخرى")
+                        except StreamLimitReached:
+                            await suhu.delete()
+                            await remove_active_chat(chat_id)
+                            await m.reply_text("🦴 البوت مشغول بمكالمات كثيرة هسه، حاول بعد شوية")
                         except NoAudioSourceFound:
                             await suhu.delete()
                             await remove_active_chat(chat_id)
@@ -17,6 +17,8 @@ along with this program. If not, see <https://www.gnu.org/licenses/licenses.html
 """
 
 
+from itertools import islice
+
 from config import BOT_USERNAME
 
 from pyrogram import Client
@@ -42,21 +44,18 @@ async def playlist(client, m: Message):
     chat_id = m.chat.id
     if chat_id in QUEUE:
         chat_queue = get_queue(chat_id)
+        now = chat_queue[0]
         if len(chat_queue) == 1:
             await m.reply(
                 f"-› **الاغنية المشغلة حاليا**`:`\n\n"
-                f"-› [{chat_queue[0][0]}]({chat_queue[0][2]}) | `{chat_queue[0][3]}`",
+                f"-› [{now.songname}]({now.ref}) | `{now.type}`",
                 reply_markup=keyboard, disable_web_page_preview=True)
         else:
             QUE = f"-› **الاغنية المشغلة حاليا**`:`\n\n" \
-                  f"-› [{chat_queue[0][0]}]({chat_queue[0][2]}) | `{chat_queue[0][3]}` \n\n" \
+                  f"-› [{now.songname}]({now.ref}) | `{now.type}` \n\n" \
                   f"**📖 قائمة الانتضار**`:`\n"
-            l = len(chat_queue)
-            for x in range(1, l):
-                han = chat_queue[x][0]
-                hok = chat_queue[x][2]
-                hap = chat_queue[x][3]
-                QUE = QUE + "\n" + f"`#{x}` - [{han}]({hok}) | `{hap}`"
+            for x, item in enumerate(islice(chat_queue, 1, None), 1):
+                QUE = QUE + "\n" + f"`#{x}` - [{item.songname}]({item.ref}) | `{item.type}`"
             await m.reply(QUE, reply_markup=keyboard, disable_web_page_preview=True)
     else:
         await m.reply("🦴 **ماكو شي مشتغل شبيك؟**")
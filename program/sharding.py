@@ -0,0 +1,91 @@
+"""
+Video + Music Stream Telegram Bot
+Copyright (c) 2022-present levina=lab <https://github.com/levina-lab>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but without any warranty; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program. If not, see <https://www.gnu.org/licenses/licenses.html>
+"""
+
+
+from io import BytesIO
+from typing import Optional
+
+from pyrogram import Client, StopPropagation, raw, utils
+from pyrogram.raw.core import TLObject
+
+from config import SHARD_COUNT, SHARD_ID
+from driver.shards import ROUTE_TOPIC, UPDATES_SHARD, owns, route, shard_of, subscribe
+
+MESSAGE_UPDATES = (
+    raw.types.UpdateNewMessage,
+    raw.types.UpdateNewChannelMessage,
+    raw.types.UpdateEditMessage,
+    raw.types.UpdateEditChannelMessage,
+)
+
+
+def _chat_of(update) -> Optional[int]:
+    """The chat an update belongs to, as pyrogram numbers it."""
+    if isinstance(update, MESSAGE_UPDATES):
+        peer = getattr(update.message, "peer_id", None)
+        return utils.get_peer_id(peer) if peer else None
+    if isinstance(update, raw.types.UpdateBotCallbackQuery):
+        return utils.get_peer_id(update.peer)
+    if isinstance(update, (raw.types.UpdateInlineBotCallbackQuery, raw.types.UpdateBotInlineQuery)):
+        return update.user_id
+    if isinstance(update, raw.types.UpdateChatParticipant):
+        return -update.chat_id
+    if isinstance(update, raw.types.UpdateChannelParticipant):
+        return utils.get_channel_id(update.channel_id)
+    return None
+
+
+def _read(data: bytes):
+    return TLObject.read(BytesIO(data))
+
+
+def _dispatch(payload):
+    # an update the receiving shard routed here, handled as if it came in
+    from driver.core import bot
+
+    update, users, chats = payload
+    bot.dispatcher.updates_queue.put_nowait((
+        _read(update),
+        {user.id: user for user in map(_read, users)},
+        {chat.id: chat for chat in map(_read, chats)},
+    ))
+
+
+# Telegram does not promise a bot's updates to every open session, so only
+# UPDATES_SHARD's bot connection receives them (see driver/core.py). Before
+# any other handler runs, it passes the ones for other shards' chats to the
+# coordinator, which forwards each to its owner; updates that name no chat
+# stay with the receiving shard
+if SHARD_COUNT > 1:
+
+    if SHARD_ID == UPDATES_SHARD:
+
+        @Client.on_raw_update(group=-100)
+        async def shard_gate(_, update, users, chats):
+            chat_id = _chat_of(update)
+            if chat_id is None or owns(chat_id):
+                return
+            route(shard_of(chat_id), (
+                update.write(),
+                [user.write() for user in users.values()],
+                [chat.write() for chat in chats.values()],
+            ))
+            raise StopPropagation
+
+    else:
+        subscribe(ROUTE_TOPIC, _dispatch)
@@ -39,8 +39,8 @@ from driver.filters import command
 from driver.core import bot, me_bot, me_user
 from driver.database.dbusers import add_served_user
 from driver.database.dbchat import add_served_chat, is_served_chat
-from driver.database.dblockchat import blacklisted_chats
-from driver.database.dbpunish import is_gbanned_user
+from driver.database.dblockchat import is_blacklisted_chat
+from driver.database.dbpunish import is_gbanned
 from driver.decorators import check_blacklist
 
 from pyrogram import Client, filters, __version__ as pyrover
@@ -172,7 +172,7 @@ async def new_chat(c: Client, m: Message):
     for member in m.new_chat_members:
         try:
             if member.id == me_bot.id:
-                if chat_id in await blacklisted_chats():
+                if is_blacklisted_chat(chat_id):
                     await m.reply_text(
                         "❗️ This chat has blacklisted by sudo user and You're not allowed to use me in this chat."
                     )
@@ -203,7 +203,7 @@ chat_watcher_group = 5
 async def chat_watcher_func(_, message: Message):
     userid = message.from_user.id
     suspect = f"[{message.from_user.first_name}](tg://user?id={message.from_user.id})"
-    if await is_gbanned_user(userid):
+    if is_gbanned(userid):
         try:
             await message.chat.ban_member(userid)
         except ChatAdminRequired:
@@ -27,7 +27,16 @@ import platform
 from config import BOT_USERNAME
 
 from program import LOGS
-from driver.core import me_bot
+from cache.members import member_stats
+from driver.core import assistants, me_bot
+from driver.database.dbqueue import playback_stats
+from driver.design.thumbnail import card_stats
+from driver.mediacache import media_cache
+from driver.queues import files, queue_stats
+from driver.resolver import pool, resolved
+from driver.search import search_stats
+from driver.supervisor import supervisor
+from driver.transcode import transcoder
 from driver.filters import command
 from driver.utils import remove_if_exists
 from driver.decorators import sudo_users_only, humanbytes
@@ -93,3 +102,73 @@ async def get_bot_logs(c: Client, m: Message):
     else:
         if not os.path.exists(bot_log_path):
             await m.reply_text('❌ no logs found !')
+
+
+@Client.on_message(command(["metrics", f"metrics@{BOT_USERNAME}"]) & ~filters.edited)
+@sudo_users_only
+async def fetch_bot_metrics(client, message):
+    queues = queue_stats()
+    largest = queues["largest"]
+    urls = resolved.stats()
+    extractors = pool.stats()
+    searches = search_stats()
+    thumbs = card_stats()
+    members = member_stats()
+    playback = playback_stats()
+    media = media_cache.stats()
+    prepared = transcoder.stats()
+    ffmpeg = supervisor.stats()
+    helpers = "\n".join(
+        f"`{a['id']}`: `{a['calls']}` calls, `{a['floods']}` floodwaits, {a['state']}"
+        for a in assistants.stats()
+    )
+    text = f"""📈 **Bot Metrics**
+
+**Queues :** `{queues['chats']}` chats / `{queues['items']}` items
+**Queue Memory :** `{humanbytes(queues['bytes'])}`
+**Largest Queue :** `{f"{largest[0]} ({humanbytes(largest[1])})" if largest else "-"}`
+**Tracked Downloads :** `{len(files)}`
+**Calls :** `{playback['active']}` active / `{playback['paused']}` paused (`{playback['pending']}` unsaved)
+**Assistants :**
+{helpers}
+**FFmpeg :** `{ffmpeg['streams']}/{ffmpeg['cap']}` stream processes for `{ffmpeg['calls']}` calls, `{ffmpeg['transcodes']}` transcodes (`{ffmpeg['suspended']}` suspended), `{ffmpeg['cpu']:.0f}%` CPU, `{humanbytes(ffmpeg['rss'])}` RSS
+**FFmpeg Guard :** `{ffmpeg['unowned']}` unmatched, `{ffmpeg['orphaned']}` orphaned, `{ffmpeg['killed']}` orphans killed, `{ffmpeg['refused']}` calls refused
+
+**Stream URL Cache :** `{urls['size']}/{urls['maxsize']}`
+**URL Cache Hit Rate :** `{urls['hit_rate']:.1%}` (`{urls['hits']}` hits / `{urls['misses']}` misses)
+**Extractors :** `{extractors['workers']}` workers, `{extractors['pending']}` pending, `{extractors['rejected']}` rejected, `{extractors['timeouts']}` timeouts
+
+**Search Cache :** `{searches['size']}/{searches['maxsize']}`
+**Search Cache Hit Rate :** `{searches['hit_rate']:.1%}` (`{searches['hits']}` hits / `{searches['misses']}` misses)
+
+**Card Cache :** `{thumbs['size']}` in memory, `{thumbs['disk_files']}` on disk (`{humanbytes(thumbs['disk_bytes'])}`)
+**Card Cache Hits :** `{thumbs['hits']}` memory / `{thumbs['disk_hits']}` disk / `{thumbs['misses'] - thumbs['disk_hits']}` rendered
+
+**Media Cache :** `{media['files']}` files, `{humanbytes(media['bytes'])}` of `{humanbytes(media['quota'])}`
+**Media Cache Hits :** `{media['hits']}` cached / `{media['shared']}` joined a download / `{media['misses']}` downloaded
+**Media Downloads :** `{media['downloading']}` running, `{media['progressive']}` played while downloading
+**Transcode Cache :** `{prepared['files']}` files, `{humanbytes(prepared['bytes'])}` of `{humanbytes(prepared['quota'])}` (`{humanbytes(prepared['reserved'])}` reserved)
+**Transcode Cache Hits :** `{prepared['hits']}` prepared / `{prepared['misses']}` live
+**Transcodes :** `{prepared['running']}` running, `{prepared['queued']}` queued, `{prepared['done']}` done, `{prepared['failed']}` failed, `{prepared['skipped']}` skipped
+
+**Member Cache :** `{members['size']}/{members['maxsize']}`, `{members['admin_lists']}` admin lists
+**Member Cache Hit Rate :** `{members['hit_rate']:.1%}` (`{members['hits']}` hits / `{members['misses']}` misses)
+"""
+    await message.reply(text)
+
+
+@Client.on_message(command(["ffmpeg", f"ffmpeg@{BOT_USERNAME}"]) & ~filters.edited)
+@sudo_users_only
+async def fetch_ffmpeg_processes(client, message):
+    supervisor.sample()
+    stats = supervisor.stats()
+    rows = "\n".join(
+        f"`{e.pid}` {e.kind} `{e.chat_id or '-'}`: `{e.cpu:.0f}%` CPU, `{humanbytes(e.rss)}`, "
+        f"`{int(e.age)}s`{' (suspended)' if e.suspended else ''}"
+        for e in supervisor.processes()[:30]
+    )
+    await message.reply(
+        f"🎛 **FFmpeg Processes** (`{stats['streams']}/{stats['cap']}` for `{stats['calls']}` calls)\n\n"
+        f"{rows or 'no ffmpeg running'}\n\n"
+        f"**Total :** `{stats['cpu']:.0f}%` CPU, `{humanbytes(stats['rss'])}` RSS"
+    )
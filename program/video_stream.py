@@ -18,7 +18,6 @@ along with this program. If not, see <https://www.gnu.org/licenses/licenses.html
 
 
 import re
-import asyncio
 
 from asyncio.exceptions import TimeoutError
 from config import BOT_USERNAME, IMG_1, IMG_2, IMG_5
@@ -28,9 +27,14 @@ from program.utils.inline import stream_markup
 from driver.design.thumbnail import thumb
 from driver.design.chatname import CHAT_TITLE
 from driver.filters import command, other_filters
-from driver.queues import QUEUE, add_to_queue
-from driver.core import calls, user, me_user
-from driver.utils import remove_if_exists, from_tg_get_msg
+from driver.mediacache import media_cache
+from driver.queues import QUEUE, QueueItem, add_to_queue
+from driver.prefetch import prefetch_next
+from driver.resolver import ytdl
+from driver.search import ytsearch
+from driver.supervisor import StreamLimitReached
+from driver.core import assistants
+from driver.utils import from_tg_get_msg, join_and_play
 from driver.decorators import require_admin, check_blacklist
 from driver.database.dbqueue import add_active_chat, remove_active_chat, music_on
 
@@ -39,51 +43,13 @@ from pyrogram.errors import UserAlreadyParticipant, UserNotParticipant
 from pyrogram.types import InlineKeyboardMarkup, Message
 
 from pytgcalls import StreamType
-from pytgcalls.types.input_stream import AudioVideoPiped
-from pytgcalls.types.input_stream.quality import (
-    HighQualityAudio,
-    HighQualityVideo,
-    LowQualityVideo,
-    MediumQualityVideo,
-)
 from pytgcalls.exceptions import (
     NoAudioSourceFound,
     NoVideoSourceFound,
     NoActiveGroupCall,
     GroupCallNotFound,
 )
-from youtubesearchpython import VideosSearch
-
-
-def ytsearch(query: str):
-    try:
-        search = VideosSearch(query, limit=1).result()
-        data = search["result"][0]
-        songname = data["title"]
-        url = data["link"]
-        duration = data["duration"]
-        thumbnail = data["thumbnails"][0]["url"]
-        return [songname, url, duration, thumbnail]
-    except Exception as e:
-        print(e)
-        return 0
 
-async def ytdl(link):
-    proc = await asyncio.create_subprocess_exec(
-        "yt-dlp",
-        "--geo-bypass",
-        "-g",
-        "-f",
-        "[height<=?720][width<=?1280]",
-        f"{link}",
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-    stdout, stderr = await proc.communicate()
-    if stdout:
-        return 1, stdout.decode().split("\n")[0]
-    else:
-        return 0, stderr.decode()
 
 def convert_seconds(seconds):
     seconds = seconds % (24 * 3600)
@@ -111,7 +77,7 @@ async def play_tg_file(c: Client, m: Message, replied: Message = None, link: str
             loser = await replied.reply("❤️‍🔥تَحمَيݪ اެݪمݪف...")
         else:
             loser = await m.reply("❤️‍🔥تَحمَيݪ اެݪمݪف...")
-        dl = await replied.download()
+        dl = await media_cache.fetch(replied, progressive=True)
         link = replied.link
         songname = "video"
         duration = "00:00"
@@ -137,7 +103,7 @@ async def play_tg_file(c: Client, m: Message, replied: Message = None, link: str
         if chat_id in QUEUE:
             await loser.edit("❤️‍🔥 تَتم اެݪاضافَة...")
             gcname = m.chat.title
-            ctitle = await CHAT_TITLE(gcname)
+            ctitle = await CHAT_TITLE(gcname, m.chat.id)
             title = songname
             userid = m.from_user.id
             thumbnail = f"{IMG_5}"
@@ -154,31 +120,20 @@ async def play_tg_file(c: Client, m: Message, replied: Message = None, link: str
                         f"-› **اެݪمدةه:** `{duration}`\n"
                         f"-› **طݪب اެݪحݪۅ:** {requester}",
             )
-            remove_if_exists(image)
         else:
             try:
                 await loser.edit("❤️‍🔥 يَتمَ اެݪتشغِيݪ اެلانِ...")
                 gcname = m.chat.title
-                ctitle = await CHAT_TITLE(gcname)
+                ctitle = await CHAT_TITLE(gcname, m.chat.id)
                 title = songname
                 userid = m.from_user.id
                 thumbnail = f"{IMG_5}"
                 image = await thumb(thumbnail, title, userid, ctitle)
-                if Q == 720:
-                    amaze = HighQualityVideo()
-                elif Q == 480:
-                    amaze = MediumQualityVideo()
-                elif Q == 360:
-                    amaze = LowQualityVideo()
                 await music_on(chat_id)
                 await add_active_chat(chat_id)
-                await calls.join_group_call(
+                await join_and_play(
                     chat_id,
-                    AudioVideoPiped(
-                        dl,
-                        HighQualityAudio(),
-                        amaze,
-                    ),
+                    QueueItem(songname, dl, link, "video", Q),
                     stream_type=StreamType().pulse_stream,
                 )
                 add_to_queue(chat_id, songname, dl, link, "video", Q)
@@ -192,11 +147,14 @@ async def play_tg_file(c: Client, m: Message, replied: Message = None, link: str
                             f"-› **اެݪمدةه:** `{duration}`\n"
                             f"-› **طݪب اެݪحݪۅ:** {requester}",
                 )
-                remove_if_exists(image)
             except (NoActiveGroupCall, GroupCallNotFound):
                 await loser.delete()
                 await remove_active_chat(chat_id)
                 await m.reply_text("🦴 ماكو مكالمة شلون اشغل يلا اكتب.\n\n» هاي .اصعد وحاول مره اخرى !")
+            except StreamLimitReached:
+                await loser.delete()
+                await remove_active_chat(chat_id)
+                await m.reply_text("🦴 البوت مشغول بمكالمات كثيرة هسه، حاول بعد شوية")
             except Exception as e:
                 LOGS.info(f"[ERROR]: {e}")
     else:
@@ -218,7 +176,8 @@ async def video_stream(c: Client, m: Message):
             "you're an __Anonymous__ user !\n\n» revert back to your real user account to use this bot."
         )
     try:
-        ubot = me_user.id
+        assistant = assistants.assistant_for(chat_id)
+        ubot = assistant.me.id
         b = await c.get_chat_member(chat_id, ubot)
         if b.status == "banned":
             try:
@@ -234,7 +193,7 @@ async def video_stream(c: Client, m: Message):
                 invitelink = invitelink.replace(
                     "https://t.me/+", "https://t.me/joinchat/"
                 )
-            await user.join_chat(invitelink)
+            await assistant.client.join_chat(invitelink)
             await remove_active_chat(chat_id)
     except UserNotParticipant:
         try:
@@ -246,7 +205,7 @@ async def video_stream(c: Client, m: Message):
                 invitelink = invitelink.replace(
                     "https://t.me/+", "https://t.me/joinchat/"
                 )
-            await user.join_chat(invitelink)
+            await assistant.client.join_chat(invitelink)
             await remove_active_chat(chat_id)
         except UserAlreadyParticipant:
             pass
@@ -267,8 +226,7 @@ async def video_stream(c: Client, m: Message):
                 Q = 720
                 loser = await c.send_message(chat_id, "❤️‍🔥 جَاެࢪي اެݪبَحثَ...")
                 query = m.text.split(None, 1)[1]
-                search = ytsearch(query)
-                amaze = HighQualityVideo()
+                search = await ytsearch(query)
                 if search == 0:
                     await loser.edit("لم يتم العثور على نتائج جرب اعطاء اسم الاغنية الكامل 🦴")
                 else:
@@ -279,7 +237,7 @@ async def video_stream(c: Client, m: Message):
                     thumbnail = search[3]
                     userid = m.from_user.id
                     gcname = m.chat.title
-                    ctitle = await CHAT_TITLE(gcname)
+                    ctitle = await CHAT_TITLE(gcname, m.chat.id)
                     image = await thumb(thumbnail, title, userid, ctitle)
                     data, ytlink = await ytdl(url)
                     if data == 0:
@@ -288,6 +246,8 @@ async def video_stream(c: Client, m: Message):
                         if chat_id in QUEUE:
                             await loser.edit("❤️‍🔥 تَتم اެݪاضافَة...")
                             pos = add_to_queue(chat_id, songname, ytlink, url, "video", Q)
+                            if pos == 1:
+                                prefetch_next(chat_id)
                             await loser.delete()
                             requester = f"[{m.from_user.first_name}](tg://user?id={m.from_user.id})"
                             buttons = stream_markup(user_id)
@@ -296,19 +256,14 @@ async def video_stream(c: Client, m: Message):
                                 reply_markup=InlineKeyboardMarkup(buttons),
                                 caption=f"-› **اެبشࢪ عيني ضفتها للانتضار -› ** `{pos}`\n\n-› **اެݪاسم:** [{songname}]({url}) | `الفيديو`\n-›  **اެݪمدةه:** `{duration}`\n-› **طݪب اެݪحݪۅ:** {requester}",
                             )
-                            remove_if_exists(image)
                         else:
                             try:
                                 await loser.edit("❤️‍🔥 يَتمَ اެݪتشغِيݪ اެلانِ...")
                                 await music_on(chat_id)
                                 await add_active_chat(chat_id)
-                                await calls.join_group_call(
+                                await join_and_play(
                                     chat_id,
-                                    AudioVideoPiped(
-                                        ytlink,
-                                        HighQualityAudio(),
-                                        amaze,
-                                    ),
+                                    QueueItem(songname, ytlink, url, "video", Q),
                                     stream_type=StreamType().local_stream,
                                 )
                                 add_to_queue(chat_id, songname, ytlink, url, "video", Q)
@@ -320,11 +275,14 @@ async def video_stream(c: Client, m: Message):
                                     reply_markup=InlineKeyboardMarkup(buttons),
                                     caption=f"-› **اެݪاسم:** [{songname}]({url}) | `الفيديو`\n-› **اެݪمدةه:** `{duration}`\n-› **طݪب اެݪحݪۅ:** {requester}",
                                 )
-                                remove_if_exists(image)
                             except (NoActiveGroupCall, GroupCallNotFound):
                                 await loser.delete()
                                 await remove_active_chat(chat_id)
                                 await m.reply_text("🦴 ماكو مكالمة شلون اشغل يلا اكتب.\n\n» هاي .اصعد وحاول مره اخرى !")
+                            except StreamLimitReached:
+                                await loser.delete()
+                                await remove_active_chat(chat_id)
+                                await m.reply_text("🦴 البوت مشغول بمكالمات كثيرة هسه، حاول بعد شوية")
                             except NoVideoSourceFound:
                                 await loser.delete()
                                 await remove_active_chat(chat_id)
@@ -346,8 +304,7 @@ async def video_stream(c: Client, m: Message):
             Q = 720
             loser = await c.send_message(chat_id, "❤️‍🔥 جَاެࢪي اެݪبَحثَ...")
             query = m.text.split(None, 1)[1]
-            search = ytsearch(query)
-            amaze = HighQualityVideo()
+            search = await ytsearch(query)
             if search == 0:
                 await loser.edit("لم يتم العثور على نتائج جرب اعطاء اسم الاغنية الكامل 🦴")
             else:
@@ -358,7 +315,7 @@ async def video_stream(c: Client, m: Message):
                 thumbnail = search[3]
                 userid = m.from_user.id
                 gcname = m.chat.title
-                ctitle = await CHAT_TITLE(gcname)
+                ctitle = await CHAT_TITLE(gcname, m.chat.id)
                 image = await thumb(thumbnail, title, userid, ctitle)
                 data, ytlink = await ytdl(url)
                 if data == 0:
@@ -367,6 +324,8 @@ async def video_stream(c: Client, m: Message):
                     if chat_id in QUEUE:
                         await loser.edit("❤️‍🔥 تَتم اެݪاضافَة...")
                         pos = add_to_queue(chat_id, songname, ytlink, url, "video", Q)
+                        if pos == 1:
+                            prefetch_next(chat_id)
                         await loser.delete()
                         requester = f"[{m.from_user.first_name}](tg://user?id={m.from_user.id})"
                         buttons = stream_markup(user_id)
@@ -375,19 +334,14 @@ async def video_stream(c: Client, m: Message):
                             reply_markup=InlineKeyboardMarkup(buttons),
                             caption=f"-› **اެبشࢪ عيني ضفتها ݪݪانتضاࢪ -› ** `{pos}`\n\n-› **اެݪاسم:** [{songname}]({url}) | `الفيديو`\n-› **اެݪمدةه:** `{duration}`\n-› **طݪب اެݪحݪۅ:** {requester}",
                         )
-                        remove_if_exists(image)
                     else:
                         try:
                             await loser.edit("❤️‍🔥 يَتمَ اެݪتشغِيݪ اެلانِ...")
                             await music_on(chat_id)
                             await add_active_chat(chat_id)
-                            await calls.join_group_call(
+                            await join_and_play(
                                 chat_id,
-                                AudioVideoPiped(
-                                    ytlink,
-                                    HighQualityAudio(),
-                                    amaze,
-                                ),
+                                QueueItem(songname, ytlink, url, "video", Q),
                                 stream_type=StreamType().local_stream,
                             )
                             add_to_queue(chat_id, songname, ytlink, url, "video", Q)
@@ -399,11 +353,14 @@ async def video_stream(c: Client, m: Message):
                                 reply_markup=InlineKeyboardMarkup(buttons),
                                 caption=f"-› **اެݪاسم:** [{songname}]({url}) | `الفيديو`\n-› **اެݪمدةه:** `{duration}`\n-› **طݪب اެݪحݪۅ:** {requester}",
                             )
-                            remove_if_exists(image)
                         except (NoActiveGroupCall, GroupCallNotFound):
                             await loser.delete()
                             await remove_active_chat(chat_id)
                             await m.reply_text("🦴 ماكو مكالمة شلون اشغل يلا اكتب.\n\n» هاي .اصعد وحاول مره اخرى !")
+                        except StreamLimitReached:
+                            await loser.delete()
+                            await remove_active_chat(chat_id)
+                            await m.reply_text("🦴 البوت مشغول بمكالمات كثيرة هسه، حاول بعد شوية")
                         except NoVideoSourceFound:
                             await loser.delete()
                             await remove_active_chat(chat_id)
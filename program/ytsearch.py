@@ -20,9 +20,9 @@ along with this program. If not, see <https://www.gnu.org/licenses/licenses.html
 from config import BOT_USERNAME
 from driver.decorators import check_blacklist
 from driver.filters import command
+from driver.search import search
 from pyrogram import Client, filters
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
-from youtube_search import YoutubeSearch
 
 
 @Client.on_message(command(["رابط", f"search@{BOT_USERNAME}"]) & ~filters.edited)
@@ -32,15 +32,17 @@ async def youtube_search(_, message: Message):
         return await message.reply_text("/search **needs an argument !**")
     query = message.text.split(None, 1)[1]
     m = await message.reply_text("🦴 **جاري البحث...**")
-    results = YoutubeSearch(query, max_results=5).to_dict()
+    results = await search(query, limit=5)
+    if not results:
+        return await m.edit_text("❌ **لم يتم العثور على نتائج**")
     text = ""
     for i in range(5):
         try:
             text += f"-› **الاسم:** __{results[i]['title']}__\n"
             text += f"-› **المدو:** `{results[i]['duration']}`\n"
-            text += f"-› **المشاهدات:** `{results[i]['views']}`\n"
-            text += f"-› **القناة:** {results[i]['channel']}\n"
-            text += f"-› **الرابط:** https://www.youtube.com{results[i]['url_suffix']}\n\n"
+            text += f"-› **المشاهدات:** `{results[i]['viewCount']['text']}`\n"
+            text += f"-› **القناة:** {results[i]['channel']['name']}\n"
+            text += f"-› **الرابط:** {results[i]['link']}\n\n"
         except IndexError:
             break
     await m.edit_text(